@@ -12,13 +12,31 @@ scans or line scans:
     saft
     lecroy
     ultravision
+    write_ultravision_binary
     civa_bscan
+    scan_catalog
+    sscan
+    raster
+    profile
+    CancelToken
+    Conditioning
+    overview
 """
 # from __future__ import absolute_import
 
 from .saft import saft
 from .lecroy import lecroy
-from .ultravision import ultravision
+from .ultravision import ultravision, write_ultravision_binary
 from . import civa
+from . import headers
+from . import pool
+from . import cache
+from .catalog import scan_catalog
+from .sscan import sscan
+from .raster import raster
+from .profiling import profile
+from .progress import CancelToken, ReadCancelled
+from .conditioning import Conditioning
+from .overview import overview, Overview
 
 
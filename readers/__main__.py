@@ -0,0 +1,4 @@
+import sys
+from .cli import cli
+
+sys.exit(cli())
@@ -1,107 +1,162 @@
 """
 DEPRECATED
 """
+import os
 import time
 import numpy as np
-import pandas as pd
-from pandas.io.common import EmptyDataError
 import xarray as xr
-import gc
+from .ultravision import (_iter_headers, _map_block, _read_block, _read_magic, _skip_lines,
+                          _split_header)
+from .profiling import _profiled, _phase, _add_bytes, _add_array
 
 
 # number of lines for the data header in ultravision text file export
 NHEADER = 19
 
 
-def _process_header(header, angles, fs, speed):
-    out = dict(x=None, y=None, z=None, z_axis_type='time', units=None, focal_law=None)
+# conversion factors of the length units of the ultrasound axis to meters
+LENGTH_UNITS = {'mm': 1e-3, 'm': 1., 'in': 25.4e-3}
 
-    parts = header.index.str.split()
-    # remove unit values from the header labels
-    header.index = [' '.join([pi for pi in p if not any((c in pi) for c in set('[]()'))])
-                    for p in parts]
 
-    # construct the coordinates of the axes of the scan
-    nx, ny, nz = int(header['ScanQty']), int(header['IndexQty']), int(header['USoundQty'])
-    out['x'] = float(header['ScanStart']) + np.arange(nx) * float(header['ScanResol'])
-    out['y'] = float(header['IndexStart']) + np.arange(ny) * float(header['IndexResol'])
+def _geometry(headers, angles=None, fs=None, speed=None):
+    """
+    Computes the coordinates of all the focal laws at once, from their block headers.
+
+    Returns
+    -------
+    : dict
+        `x` and `y`: lists with the scan and index axes of each focal law. `z`: a 2-D array
+        (focal law, Z) with the ultrasound axis of each focal law, padded with NaN if the
+        focal laws do not have the same number of samples. `z_start`, `z_step` and `nz`: the
+        start, step and number of samples of each focal law ultrasound axis. If (angles, fs,
+        speed) are given, the ultrasound axis is in seconds, otherwise it is in the units of
+        the header. `z_axis_type`: the projection of the ultrasound axis. `units`: the units of
+        the axes. `focal_law`: the focal law numbers.
+    """
+    fields = [_split_header(h) for h in headers]
+    values = [f[0] for f in fields]
+    units = fields[0][1]
+    out = dict(z_axis_type='time', units=None, focal_law=None)
 
-    # get the units of the scan
-    units = [p[-1][1:-1] if p[-1][0] == '(' and p[-1][-1] == ')' else None for p in parts]
-    units = pd.Series(units, index=header.index)
-    out['units'] = {'x': units['IndexResol'], 'y': units['ScanResol'], 'z': units['USoundResol']}
+    out['x'] = [float(v['ScanStart']) + np.arange(int(v['ScanQty'])) * float(v['ScanResol'])
+                for v in values]
+    out['y'] = [float(v['IndexStart']) + np.arange(int(v['IndexQty'])) * float(v['IndexResol'])
+                for v in values]
+    out['units'] = {'x': units['ScanResol'], 'y': units['IndexResol'], 'z': units['USoundResol']}
+    out['focal_law'] = np.array([float(v['Focal Law']) for v in values])
 
-    # work on the time axis
-    zstart = float(header['USoundStart'])
+    # work on the time axis, for all focal laws at once
+    out['nz'] = np.array([int(v['USoundQty']) for v in values])
+    zstart = np.array([float(v['USoundStart']) for v in values])
+    projection = np.array([(f[2]['USoundStart'] or '').lower() for f in fields])
     if any(val is None for val in [angles, fs, speed]):
         print('Warning: scan parameters not specified. Falling back to header values for'
               'time axis, which might not be precise.')
-        out['z'] = zstart + np.arange(nz) * float(header['USoundResol'])
-        if 'Half Path' in ' '.join(parts[10]):
-            out['z_axis_type'] = 'half path'
-        elif 'True Depth' in ' '.join(parts[10]):
-            out['z_axis_type'] = 'true depth'
-        else:
-            out['z_axis_type'] = 'unknown'
+        out['z_start'] = zstart
+        out['z_step'] = np.array([float(v['USoundResol']) for v in values])
+        out['z_axis_type'] = [str(p) if p in ('half path', 'true depth') else 'unknown'
+                              for p in projection]
     else:
-        # convert time to axis to time (seconds)
-        if 'Half Path' in ' '.join(parts[10]):
-            zstart *= 2/speed
-        elif 'True Depth' in ' '.join(parts[10]):
-            zstart *= 2/(speed*np.cos(np.deg2rad(angles[0])))
-        else:
-            # TODO: assuming True depth if nothing is specified
-            zstart *= 2/(speed*np.cos(np.deg2rad(angles[0])))
-        out['z'] = (zstart + np.arange(nz))/fs
+        # convert the start of the ultrasound axis to time (seconds), using the refracted
+        # angle of each focal law for true depth axes
+        # TODO: assuming True depth if nothing is specified
+        cosine = np.where(projection == 'half path', 1., np.cos(np.deg2rad(angles)))
+        scale = LENGTH_UNITS.get(units['USoundStart'], 1e-3)
+        out['z_start'] = zstart * scale * 2/(speed*cosine)
+        out['z_step'] = np.full(len(values), 1/fs)
+        out['z_axis_type'] = ['time'] * len(values)
         out['units']['z'] = 's'
 
-    out['focal_law'] = float(header['Focal Law'])
+    samples = np.arange(out['nz'].max())
+    out['z'] = out['z_start'][:, np.newaxis] + samples * out['z_step'][:, np.newaxis]
+    out['z'][samples >= out['nz'][:, np.newaxis]] = np.nan
+    return out
+
+
+def _resample(data, z_start, z_step, z):
+    """
+    Linearly interpolates all the focal laws of a phased array cube onto a common Z axis, in one
+    batched operation over all the focal laws and scan positions.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Array with the ultrasound axis and focal laws as the last two axes (..., Z, angle).
+
+    z_start, z_step : numpy.ndarray
+        The start and step of the ultrasound axis of each focal law.
+
+    z : numpy.ndarray
+        The common Z axis. Values outside the ultrasound axis of a focal law are set to NaN.
+    """
+    nz, nlaws = data.shape[-2:]
+    # fractional sample index of the common axis in each focal law, shape (Z, angle)
+    pos = (z[:, np.newaxis] - z_start) / z_step
+    valid = (pos >= 0) & (pos <= nz - 1)
+    ind = np.clip(np.floor(pos).astype(int), 0, max(nz - 2, 0))
+    weight = np.clip(pos - ind, 0, 1)
+    law = np.arange(nlaws)
+    out = data[..., ind, law] * (1 - weight) + data[..., np.minimum(ind + 1, nz - 1), law] * weight
+    out[..., ~valid] = np.nan
     return out
 
 
 def _read_file(fname, angles=None, fs=None, speed=None):
-    skiprows = 0
-    headers, data = [], []
-    n = 0
-    only_first_header = False if any(val is None for val in [angles, fs, speed]) else True
-    try:
-        while True:
-            if (only_first_header and (n == 0)) or (not only_first_header):
-                # read header once. Ignore all other headers...
-                header = pd.read_table(fname,
-                                       skiprows=skiprows,
-                                       nrows=NHEADER,
-                                       sep='=',
-                                       skipinitialspace=True,
-                                       header=None,
-                                       engine='c',
-                                       index_col=0,
-                                       squeeze=True).str.strip()
-                headers.append(_process_header(header, angles, fs, speed))
-            skiprows += NHEADER
-            nx, ny, nz = len(headers[-1]['x']), len(headers[-1]['y']), len(headers[-1]['z'])
-            u = pd.read_table(fname,
-                              skiprows=skiprows,
-                              nrows=nx * ny,
-                              sep='\t',
-                              skipinitialspace=True,
-                              header=None,
-                              engine='c',
-                              index_col=False)
-            # the last column is giving NaN values, just remove it.
-            data.append(u.iloc[:, :-1].values.reshape(nx, ny, -1, order='F'))
-            skiprows += nx * ny
-            # memory management
-            del u
-            gc.collect()
-            n += 1
-    except EmptyDataError:
-        # we reached end of file
-        pass
-    return headers, data
-
-
-def ultravision(fname, angles=None, fs=None, speed=None):
+    """
+    Reads all the blocks of the file. An index pass over the block headers is done first, so
+    that the memory for all the blocks is allocated once, and each block is parsed directly in
+    its place.
+
+    Returns
+    -------
+    : tuple
+        The list of block headers, and the data. If (angles, fs, speed) are all given, the data
+        is a 4-D array with the focal laws along the last axis. Otherwise, the data is a list
+        with one 3-D array for each block, all of which are views into one shared buffer.
+    """
+    single_array = False if any(val is None for val in [angles, fs, speed]) else True
+    with _phase('header'):
+        blocks = list(_iter_headers(fname))
+        # the index pass scans through the whole file
+        _add_bytes(os.path.getsize(fname))
+        headers = [header for _, header in blocks]
+        shapes = []
+        for header in headers:
+            values = _split_header(header)[0]
+            shapes.append((int(values['ScanQty']), int(values['IndexQty']),
+                           int(values['USoundQty'])))
+
+    if single_array:
+        if len(angles) != len(blocks):
+            raise ValueError('Number of angles ({}) does not match the number of focal laws in '
+                             'the file ({}).'.format(len(angles), len(blocks)))
+        if any(shape != shapes[0] for shape in shapes):
+            raise ValueError('All focal laws should have the same dimensions.')
+        cube = np.empty(shapes[0] + (len(blocks),))
+        _add_array(cube)
+        data = [cube[..., i] for i in range(len(blocks))]
+    else:
+        sizes = np.cumsum([0] + [np.prod(shape) for shape in shapes])
+        buf = np.empty(sizes[-1])
+        _add_array(buf)
+        data = [buf[start:stop].reshape(shape)
+                for start, stop, shape in zip(sizes[:-1], sizes[1:], shapes)]
+
+    with open(fname, 'rb') as fid, _phase('parse'):
+        dtype = _read_magic(fid)
+        for (offset, _), (nx, ny, nz), d in zip(blocks, shapes, data):
+            fid.seek(offset)
+            _skip_lines(fid, NHEADER)
+            if dtype is None:
+                _read_block(fid, nx, ny, nz, out=d)
+            else:
+                d[...] = _map_block(fname, fid.tell(), dtype, nx, ny, nz)
+        _add_bytes(fid.tell())
+    return headers, (cube if single_array else data)
+
+
+@_profiled('ultravision_pa')
+def ultravision(fname, angles=None, fs=None, speed=None, resample=False):
     """
     Reads ultrasound scans saved in UltraVision (ZETEC, Inc. software) text file format.
 
@@ -121,12 +176,20 @@ def ultravision(fname, angles=None, fs=None, speed=None):
     speed : float, optional
         The wave speed in the test specimen
 
+    resample : bool, array_like, optional
+        Only used for phased array data, when (angles, fs, speed) are supplied. The start of the
+        time axis of each focal law depends on its angle. If True, all the focal laws are
+        interpolated onto a common time axis, spanning the time axes of all focal laws with a
+        step of 1/fs. An array can also be given to be used as the common time axis.
+
     Returns
     -------
     : xarray.DataArray
         If (angles, fs, speed) are supplied, a 4-D datarray is returned if the files contains
         multiple angles, with the fourth dimension being the angle, otherwise if only one angle
-        is present, a 3-D datarray is returned.
+        is present, a 3-D datarray is returned. Unless the data is resampled, the `Z`
+        coordinate is the time axis of the first focal law, and the time axis of each focal law
+        is given in the 2-D coordinate `Z_law` (angle, Z).
 
     : dict
         If any(angles, fs, speed) is not specified, then a dictionary is returned with each angle
@@ -139,42 +202,58 @@ def ultravision(fname, angles=None, fs=None, speed=None):
         angles = [angles]
 
     headers, data = _read_file(fname, angles, fs, speed)
+    with _phase('coords'):
+        g = _geometry(headers, angles, fs, speed)
 
-    # not phased array data
-    if len(headers) == 1 and len(data) == 1:
-        h, data = headers[0], data[0]
-        out = xr.DataArray(data, coords=[('X', h['x']), ('Y', h['y']), ('Z', h['z'])])
-    elif len(headers) == 1 and len(data) > 1:
-        # Compute angle ID's if they are not specified
-        h = headers[0]
-        if angles is None:
-            angles = np.arange(h['focal_law'], h['focal_law'] + len(data))
-        out = xr.DataArray(np.stack(data, axis=3),
-                           coords=[('X', h['x']),
-                                   ('Y', h['y']),
-                                   ('Z', h['z']),
-                                   ('angle', angles)])
+    if isinstance(data, np.ndarray):
+        # all focal laws were read in a single 4-D array
+        z = g['z'][0]
+        if data.shape[3] == 1:
+            out = xr.DataArray(data[..., 0], coords=[('X', g['x'][0]), ('Y', g['y'][0]), ('Z', z)])
+        else:
+            if resample is not False:
+                if resample is True:
+                    start, stop = np.nanmin(g['z']), np.nanmax(g['z'])
+                    z = start + np.arange(int(np.round((stop - start)*fs)) + 1)/fs
+                else:
+                    z = np.asarray(resample, dtype=float)
+                with _phase('reshape'):
+                    data = _resample(data, g['z_start'], g['z_step'], z)
+                    _add_array(data)
+            out = xr.DataArray(data,
+                               coords=[('X', g['x'][0]),
+                                       ('Y', g['y'][0]),
+                                       ('Z', z),
+                                       ('angle', angles)])
+            if resample is False:
+                out.coords['Z_law'] = (('angle', 'Z'), g['z'])
+                out.coords['Z_law'].attrs['units'] = g['units']['z']
+    elif len(data) == 1:
+        # not phased array data
+        out = xr.DataArray(data[0], coords=[('X', g['x'][0]), ('Y', g['y'][0]), ('Z', g['z'][0])])
     else:
         if angles is None:
-            angles = [h['focal_law'] for h in headers]
+            angles = list(g['focal_law'])
 
             # check if all focal_law headers are unique
             if len(set(angles)) != len(headers):
                 angles = list(range(len(headers)))
 
         out = {}
-        for h, a, d in zip(headers, angles, data):
-            out[a] = xr.DataArray(d, coords=[('X', h['x']), ('Y', h['y']), ('Z', h['z'])])
-            out[a].coords['X'].attrs['units'] = h['units']['x']
-            out[a].coords['Y'].attrs['units'] = h['units']['y']
-            out[a].coords['Z'].attrs['units'] = h['units']['z']
-            out[a].coords['Z'].attrs['projection'] = h['z_axis_type']
+        for i, (a, d) in enumerate(zip(angles, data)):
+            out[a] = xr.DataArray(d, coords=[('X', g['x'][i]),
+                                             ('Y', g['y'][i]),
+                                             ('Z', g['z'][i, :g['nz'][i]])])
+            out[a].coords['X'].attrs['units'] = g['units']['x']
+            out[a].coords['Y'].attrs['units'] = g['units']['y']
+            out[a].coords['Z'].attrs['units'] = g['units']['z']
+            out[a].coords['Z'].attrs['projection'] = g['z_axis_type'][i]
 
     if not isinstance(out, dict):
-        out.coords['X'].attrs['units'] = headers[0]['units']['x']
-        out.coords['Y'].attrs['units'] = headers[0]['units']['y']
-        out.coords['Z'].attrs['units'] = headers[0]['units']['z']
-        out.coords['Z'].attrs['projection'] = headers[0]['z_axis_type']
+        out.coords['X'].attrs['units'] = g['units']['x']
+        out.coords['Y'].attrs['units'] = g['units']['y']
+        out.coords['Z'].attrs['units'] = g['units']['z']
+        out.coords['Z'].attrs['projection'] = g['z_axis_type'][0]
 
     return out
 
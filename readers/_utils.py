@@ -0,0 +1,36 @@
+"""
+Helpers shared by the readers.
+"""
+import numpy as np
+
+
+def _roi_mask(coord, sel):
+    """
+    Returns a boolean mask of the values of `coord` inside the region of interest `sel`, given
+    as `slice(start, stop)` in the units of the coordinate. As for label based indexing in
+    pandas and xarray, both bounds are included, and a bound set to None is not limited. If
+    `sel` is None, all the values are selected.
+    """
+    coord = np.asarray(coord)
+    mask = np.ones(len(coord), dtype=bool)
+    if sel is None:
+        return mask
+    if not isinstance(sel, slice) or sel.step is not None:
+        raise ValueError('The region of interest should be given as slice(start, stop), in the '
+                         'units of the coordinate.')
+    if sel.start is not None:
+        mask &= coord >= sel.start
+    if sel.stop is not None:
+        mask &= coord <= sel.stop
+    return mask
+
+
+def _roi_indices(coord, sel):
+    """
+    Converts the region of interest `sel` (see :func:`_roi_mask`) of a monotonic coordinate
+    into a slice of indices, with explicit start and stop.
+    """
+    ind = np.flatnonzero(_roi_mask(coord, sel))
+    if len(ind) == 0:
+        return slice(0, 0)
+    return slice(int(ind[0]), int(ind[-1]) + 1)
@@ -0,0 +1,145 @@
+"""
+In-process cache of the metadata decoded by the readers: headers, and the coordinate axes
+derived from them. Entries are keyed on the identity of the file (path, size and modification
+time), so that reading a file again, or another file of a session, skips the metadata work
+as long as the file is unchanged.
+
+The cache keeps up to `MAX_ENTRIES` entries and `MAX_BYTES` bytes of arrays, evicting the least
+recently used entries first. Use :func:`configure` to change the limits, and
+:func:`invalidate` to drop the entries of a file, or all entries.
+"""
+import copy
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+# maximum number of entries
+MAX_ENTRIES = 256
+
+# maximum total size of the arrays held by the entries
+MAX_BYTES = 64 * 2**20
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_nbytes = {'total': 0}
+
+
+def configure(max_entries=None, max_bytes=None):
+    """
+    Sets the size limits of the cache. Entries are evicted right away if needed. A limit of 0
+    disables the cache.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        Maximum number of entries.
+
+    max_bytes : int, optional
+        Maximum total size of the arrays held by the entries, in bytes.
+    """
+    global MAX_ENTRIES, MAX_BYTES
+    with _lock:
+        if max_entries is not None:
+            MAX_ENTRIES = max_entries
+        if max_bytes is not None:
+            MAX_BYTES = max_bytes
+        _evict()
+
+
+def invalidate(fname=None):
+    """
+    Drops the cached entries of a file, or of all files if `fname` is None.
+    """
+    with _lock:
+        if fname is None:
+            keys = list(_cache)
+        else:
+            path = os.path.abspath(fname)
+            keys = [key for key in _cache if key[0] == path]
+        for key in keys:
+            _nbytes['total'] -= _cache.pop(key)[1]
+
+
+def _cached(fname, kind, compute):
+    """
+    Returns the metadata of kind `kind` (e.g. `('saft',)`, or `('ultravision', fs)` when it
+    depends on the reader arguments) for a file, calling `compute()` if it is not cached.
+
+    The arrays of the cached values are made read-only, as they are shared by all the reads
+    of the file. Header objects and other mutable values are copied on each call, so that the
+    readers and their callers can modify them.
+    """
+    value = _lookup(fname, kind)
+    if value is None:
+        value = compute()
+        _store(fname, kind, value)
+    return _copy(value)
+
+
+def _key(fname, kind):
+    path = os.path.abspath(fname)
+    st = os.stat(path)
+    return path, st.st_size, st.st_mtime_ns, kind
+
+
+def _lookup(fname, kind):
+    """
+    Returns the cached metadata of kind `kind` for a file, or None if it is not cached. The
+    value is shared with the cache, see :func:`_copy`.
+    """
+    key = _key(fname, kind)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        _cache.move_to_end(key)
+        return entry[0]
+
+
+def _store(fname, kind, value):
+    """ Adds the metadata of kind `kind` of a file to the cache."""
+    if MAX_ENTRIES <= 0 or MAX_BYTES <= 0:
+        return
+    key = _key(fname, kind)
+    size = _freeze(value)
+    with _lock:
+        for old in [k for k in _cache if k[0] == key[0] and k[3] == kind and k != key]:
+            # entries of previous versions of the file
+            _nbytes['total'] -= _cache.pop(old)[1]
+        if key not in _cache:
+            _cache[key] = (value, size)
+            _nbytes['total'] += size
+        _evict()
+
+
+def _evict():
+    """ Removes the least recently used entries until the cache fits in its limits."""
+    while _cache and (len(_cache) > MAX_ENTRIES or _nbytes['total'] > MAX_BYTES):
+        _nbytes['total'] -= _cache.popitem(last=False)[1][1]
+
+
+def _freeze(value):
+    """ Makes the arrays in a cached value read-only, and returns their total size."""
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_freeze(v) for v in value.values())
+    return 0
+
+
+def _copy(value):
+    """ Copies the containers of a cached value, sharing its (read-only) arrays."""
+    if isinstance(value, np.ndarray):
+        return value
+    if isinstance(value, tuple):
+        return tuple(_copy(v) for v in value)
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    return copy.copy(value)
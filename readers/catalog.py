@@ -0,0 +1,233 @@
+"""
+Builds a catalog of all the supported scan files found under a directory tree. Only the file
+headers are read, so that shapes, axes and acquisition parameters are available without
+loading the data itself.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from .saft import NHEADER as SAFT_NHEADER, _read_header, _read_file_header
+from . import civa as _civa
+from .lecroy import _read_wavedesc
+from .ultravision import _iter_headers, _split_header
+from .headers import UltravisionHeader
+
+
+# Columns of the catalog DataFrame, in order
+COLUMNS = ['path', 'format', 'block', 'channel', 'size', 'mtime',
+           'nx', 'ny', 'nz',
+           'x_start', 'x_step', 'x_units',
+           'y_start', 'y_step', 'y_units',
+           'z_start', 'z_step', 'z_units',
+           'params', 'error']
+
+
+def scan_catalog(root, workers=None, cache=None):
+    """
+    Scans a directory tree for files in any of the supported formats (SAFT, LeCroy,
+    UltraVision and CIVA exports), and reads only their headers.
+
+    Parameters
+    ----------
+    root : string
+        The directory to scan recursively.
+
+    workers : int, optional
+        Number of processes used to read the headers. If None or 1, the headers are read in
+        the current process.
+
+    cache : string, optional
+        Path to a pickle file holding the catalog of a previous scan. Only files which are new,
+        or which changed size or modification time since the cache was written are read again.
+        The cache file is updated after the scan.
+
+    Returns
+    -------
+    : pandas.DataFrame
+        One row per data block (i.e. one row per file, except for UltraVision files where each
+        channel block gets its own row). The axes of the data are described by the number of
+        points (`nx`, `ny`, `nz`), the start value, step and units of each axis. Values which
+        cannot be determined from the header alone are NaN. The `params` column holds the
+        format specific header fields: :class:`readers.headers.SaftHeader`,
+        :class:`readers.headers.LecroyInfo` and :class:`readers.headers.UltravisionHeader`
+        objects, or a `dict` for CIVA files. Use :func:`readers.headers.collect` to gather the
+        headers of one format into a DataFrame.
+    """
+    listing = pd.DataFrame(list(_walk(root)), columns=['path', 'size', 'mtime'])
+
+    kept = pd.DataFrame(columns=COLUMNS)
+    todo = listing
+    if cache is not None and os.path.exists(cache):
+        cached = pd.read_pickle(cache)
+        keys = cached[['path', 'size', 'mtime']].drop_duplicates()
+        hit = listing.merge(keys, how='left', on=['path', 'size', 'mtime'], indicator=True)
+        hit = (hit['_merge'] == 'both').values
+        kept = cached[cached['path'].isin(listing['path'][hit])]
+        todo = listing[~hit]
+
+    items = list(todo.itertuples(index=False, name=None))
+    if workers is None or workers <= 1:
+        results = map(_scan_file, items)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(items) // (4 * workers))
+            results = list(executor.map(_scan_file, items, chunksize=chunksize))
+
+    rows = [row for res in results for row in res]
+    out = pd.concat([kept, pd.DataFrame(rows, columns=COLUMNS)], ignore_index=True)
+    out = out.sort_values(['path', 'block']).reset_index(drop=True)
+
+    if cache is not None:
+        # unsupported files are also cached, so that they are not sniffed again
+        out.to_pickle(cache)
+    return out[out['format'].notnull()].reset_index(drop=True)
+
+
+def _walk(root):
+    """ Recursively lists all files under root, with their size and modification time. """
+    for entry in os.scandir(root):
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk(entry.path)
+        elif entry.is_file():
+            st = entry.stat()
+            yield entry.path, st.st_size, st.st_mtime
+
+
+def _scan_file(item):
+    """ Reads the header(s) of one file, and returns a list of catalog rows. """
+    path, size, mtime = item
+    base = dict.fromkeys(COLUMNS, np.nan)
+    base.update(path=path, format=None, block=0, channel=None, size=size, mtime=mtime,
+                params=None, error=None)
+    try:
+        fmt = _detect(path, size)
+        if fmt is None:
+            return [base]
+        rows = _READERS[fmt](path, size)
+    except Exception as e:
+        base['error'] = '{}: {}'.format(type(e).__name__, e)
+        return [base]
+
+    out = []
+    for block, row in enumerate(rows):
+        r = dict(base, format=fmt, block=block)
+        r.update(row)
+        out.append(r)
+    return out
+
+
+def _detect(path, size):
+    """ Sniffs the format of a file from its first bytes. """
+    with open(path, 'rb') as fid:
+        head = fid.read(SAFT_NHEADER)
+
+    if b'WAVEDESC' in head[:50]:
+        return 'lecroy'
+
+    text = head.decode('latin-1')
+    first = text.split('\n', 1)[0]
+    if (first.startswith('Version') or first.startswith('UVBINARY')) and 'Channel' in text:
+        return 'ultravision'
+    if first.startswith('CoordContext'):
+        return 'civa_true_cscan'
+    if ';' in first and 'scanning' in first:
+        return 'civa_cscan'
+    if _is_saft(head, size):
+        return 'saft'
+    if b'\x00' not in head and ';' in text:
+        try:
+            _, ind = _civa._bscan_header(path, 18)
+        except (IOError, UnicodeDecodeError):
+            return None
+        if len(ind) > 0:
+            return 'civa_bscan'
+    return None
+
+
+def _is_saft(head, size):
+    """ Checks that a SAFT header can be parsed, and that it is consistent with file size. """
+    if len(head) < SAFT_NHEADER:
+        return False
+    try:
+        h = _read_header(head)
+    except (ValueError, IndexError):
+        return False
+    nbytes = 2 if h['data_16bit'] else 1
+    ascan_len = h['samp_ascan_length'] * nbytes + 2**5
+    return size - SAFT_NHEADER == h['scan_xpoints'] * h['scan_ypoints'] * ascan_len > 0
+
+
+def _saft_rows(path, size):
+    h = _read_file_header(path)
+    ns = h['samp_ascan_length']
+    fs = ns * 1e9 / (h['samp_windowstop_ns'] - h['samp_windowstart_ns'])
+    # same conversions as in readers.saft: inches to meters, and nanoseconds to seconds
+    return [dict(nx=h['scan_xpoints'], ny=h['scan_ypoints'], nz=ns,
+                 x_start=0., x_step=h['scan_xstep_in'] * 25.4e-3, x_units='m',
+                 y_start=0., y_step=h['scan_ystep_in'] * 25.4e-3, y_units='m',
+                 z_start=h['samp_windowstart_ns'] * 1e-9, z_step=1 / fs, z_units='s',
+                 params=h)]
+
+
+def _lecroy_rows(path, size):
+    with open(path, 'rb') as fid:
+        info, desc = _read_wavedesc(fid)
+    info['filename'] = path
+    nz = desc['wave_array_1'] // (2 if desc['comm_type'] else 1)
+    return [dict(channel=str(info['channel']), nx=1, ny=1, nz=nz,
+                 z_start=desc['horiz_offset'] + desc['horiz_interval'],
+                 z_step=desc['horiz_interval'], z_units='s',
+                 params=info)]
+
+
+def _ultravision_rows(path, size):
+    rows = []
+    for offset, header in _iter_headers(path):
+        values, units, qualifiers = _split_header(header)
+        params = UltravisionHeader.from_split(values, units, qualifiers, offset)
+        rows.append(dict(channel=values['Channel'],
+                         nx=int(values['ScanQty']),
+                         ny=int(values['IndexQty']),
+                         nz=int(values['USoundQty']),
+                         x_start=float(values['ScanStart']),
+                         x_step=float(values['ScanResol']),
+                         x_units=units['ScanResol'],
+                         y_start=float(values['IndexStart']),
+                         y_step=float(values['IndexResol']),
+                         y_units=units['IndexResol'],
+                         z_start=float(values['USoundStart']),
+                         z_step=float(values['USoundResol']),
+                         z_units=units['USoundResol'],
+                         params=params))
+    return rows
+
+
+def _civa_cscan_rows(path, size):
+    with open(path, encoding='iso8859_15') as fid:
+        columns = fid.readline().strip().split(';')
+    return [dict(x_units='mm', y_units='mm', params={'columns': columns})]
+
+
+def _civa_true_cscan_rows(path, size):
+    X, Y = _civa._true_cscan_header(path)
+    return [dict(nx=len(X), ny=len(Y),
+                 x_start=X[0], x_step=X[1] - X[0] if len(X) > 1 else np.nan, x_units='mm',
+                 y_start=Y[0], y_step=Y[1] - Y[0] if len(Y) > 1 else np.nan, y_units='mm',
+                 params={})]
+
+
+def _civa_bscan_rows(path, size):
+    coords, ind = _civa._bscan_header(path, 18)
+    X = coords[ind - 1]
+    return [dict(nx=len(X), x_start=X[0], x_step=X[1] - X[0] if len(X) > 1 else np.nan,
+                 x_units='mm', z_units='s', params={'X': X})]
+
+
+_READERS = {'saft': _saft_rows,
+            'lecroy': _lecroy_rows,
+            'ultravision': _ultravision_rows,
+            'civa_cscan': _civa_cscan_rows,
+            'civa_true_cscan': _civa_true_cscan_rows,
+            'civa_bscan': _civa_bscan_rows}
@@ -1,9 +1,17 @@
+import os
 import numpy as np
 import xarray as xr
 import pandas as pd
 import re
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from itertools import islice
+from ._utils import _roi_mask
+from .profiling import _profiled, _phase, _add_bytes, _add_array
+from .cache import _cached
 
 
+@_profiled('civa_cscan')
 def cscan(file_name):
     """
     Reads a C-scan file saved from a CIVA simulation. The X-Y axis coordinates are returned in
@@ -20,18 +28,23 @@ def cscan(file_name):
         The simulation C-scan. It has two coordinate axes: X, Y, and each coordinate has an
         attribute `units` indicating the units for the axis.
     """
-    scan = pd.read_table(file_name,
-                         sep=';',
-                         usecols=[0, 1, 4],
-                         encoding='iso8859_15',
-                         index_col=[0, 1],
-                         squeeze=True).unstack()
-    da = xr.DataArray(scan.values, coords=[('Y', scan.index), ('X', scan.columns)])
+    with _phase('parse'):
+        scan = pd.read_table(file_name,
+                             sep=';',
+                             usecols=[0, 1, 4],
+                             encoding='iso8859_15',
+                             index_col=[0, 1]).squeeze('columns')
+        _add_bytes(os.path.getsize(file_name))
+    with _phase('reshape'):
+        scan = scan.unstack()
+    with _phase('output'):
+        da = xr.DataArray(scan.values, coords=[('Y', scan.index), ('X', scan.columns)])
     da.coords['X'].attrs['units'] = 'mm'
     da.coords['Y'].attrs['units'] = 'mm'
     return da
 
 
+@_profiled('civa_true_cscan')
 def true_cscan(file_name):
     """
     Reads a True C-scan file saved from a CIVA simulation.
@@ -47,36 +60,30 @@ def true_cscan(file_name):
         The simulation True C-scan. The `DataArray` has two coords: X, Y, and each coord has a
         `units` attribute.
     """
-    with open(file_name) as fid:
-        parts = fid.readline().split(';')
-        xlims = [float(parts[1]), float(parts[2])]
-        ylims = [float(parts[3]), float(parts[4])]
-
-        # skip next line
-        fid.readline()
-        xstep = float(fid.readline().split(';')[1])
-        ystep = float(fid.readline().split(';')[1])
-
-    nx = int(np.round(np.diff(xlims)/xstep))
-    ny = int(np.round(np.diff(ylims)/ystep))
-    X = np.arange(nx)*xstep + xlims[0]
-    Y = np.arange(ny)*ystep + ylims[0]
+    with _phase('header'):
+        X, Y = _cached(file_name, ('civa_true_cscan',), lambda: _true_cscan_header(file_name))
 
-    data = np.genfromtxt(file_name,
-                         delimiter=';',
-                         skip_header=5,
-                         usecols=(0, 1, 5))
-    vals = np.zeros((len(Y), len(X)))
-    x_ind = data[:, 1].astype(int)
-    y_ind = data[:, 0].astype(int)
-    vals[x_ind, y_ind] = data[:, 2]
-    da = xr.DataArray(vals, coords=[('Y', Y), ('X', X)])
+    with _phase('parse'):
+        data = np.genfromtxt(file_name,
+                             delimiter=';',
+                             skip_header=5,
+                             usecols=(0, 1, 5))
+        _add_bytes(os.path.getsize(file_name))
+    with _phase('reshape'):
+        vals = np.zeros((len(Y), len(X)))
+        _add_array(vals)
+        x_ind = data[:, 1].astype(int)
+        y_ind = data[:, 0].astype(int)
+        vals[x_ind, y_ind] = data[:, 2]
+    with _phase('output'):
+        da = xr.DataArray(vals, coords=[('Y', Y), ('X', X)])
     da.coords['Y'].attrs['units'] = 'mm'
     da.coords['X'].attrs['units'] = 'mm'
     return da
 
 
-def bscan(file_name):
+@_profiled('civa_bscan')
+def bscan(file_name, x=None, z=None):
     """
     Reads a B-scan txt file saved in CIVA-UT modeling software.
 
@@ -85,6 +92,11 @@ def bscan(file_name):
     file_name : str
         Name of the file, including the full path if not in the current directory.
 
+    x, z : slice, optional
+        Region of interest along the scan (X, mm) and time (Z, seconds) axes, given as
+        `slice(start, stop)` in the units of the coordinates, with both bounds included. Only
+        the rows inside the Z window, and the columns inside the X window, are parsed.
+
     Returns
     -------
     bscan : xarray.DatArray
@@ -94,27 +106,34 @@ def bscan(file_name):
     skip_lines = 18
 
     # read the header
-    with open(file_name) as fid:
-        for i, line in enumerate(fid):
-            if i == skip_lines-1:
-                coords = re.findall(r'\d*\.?\d+', line)
-                coords = np.array([float(val) for val in coords])
-                cols = line.split(';')
-                ind = np.array([j for j, c in enumerate(cols) if 'val' in c])
-                break
+    with _phase('header'):
+        coords, ind = _cached(file_name, ('civa_bscan', skip_lines),
+                              lambda: _bscan_header(file_name, skip_lines))
 
-    d = np.genfromtxt(file_name, delimiter=';', skip_header=skip_lines)
+    X = coords[ind-1]
+    xmask = _roi_mask(X, x)
+    with open(file_name) as fid, _phase('parse'):
+        rows = islice(fid, skip_lines, None)
+        if z is not None:
+            # the time axis is in microseconds in CIVA b-scan file
+            rows = _rows_in_window(rows, z, 1e-6)
+        d = np.genfromtxt(rows, delimiter=';', usecols=[0] + list(ind[xmask]))
+        _add_bytes(os.path.getsize(file_name))
+        _add_array(d)
+    d = d.reshape(-1, xmask.sum() + 1)
     # convert from microseconds in CIVA b-scan file to seconds
     Z = d[:, 0]*1e-6
-    X = coords[ind-1]
-    b = d[:, ind]
+    X = X[xmask]
+    b = d[:, 1:]
 
-    da = xr.DataArray(b, coords=[('Z', Z), ('X', X)])
+    with _phase('output'):
+        da = xr.DataArray(b, coords=[('Z', Z), ('X', X)])
     da.coords['Z'].attrs['units'] = 's'
     da.coords['X'].attrs['units'] = 'mm'
     return da
 
 
+@_profiled('civa_beam')
 def beam(file_name):
     """
     Reads a B-scan txt file saved in CIVA-UT modeling software.
@@ -133,22 +152,191 @@ def beam(file_name):
     # this is the default start of the header in a civa b-scan txt file
     skip_lines = 9
 
-    with open(file_name) as fid:
-        for i, line in enumerate(fid):
-            if i == skip_lines-1:
-                coords = re.findall(r'\d*\.?\d+', line)
-                coords = np.array([float(val) for val in coords])
-                cols = line.split(';')
-                ind = np.array([j for j, c in enumerate(cols) if 'val' in c])
-                break
+    with _phase('header'):
+        coords, ind = _cached(file_name, ('civa_bscan', skip_lines),
+                              lambda: _bscan_header(file_name, skip_lines))
 
-    d = np.genfromtxt(file_name, delimiter=';', skip_header=skip_lines)
+    with _phase('parse'):
+        d = np.genfromtxt(file_name, delimiter=';', skip_header=skip_lines)
+        _add_bytes(os.path.getsize(file_name))
+        _add_array(d)
     # convert from microseconds in CIVA b-scan file to seconds
     Z = d[:, 0]
     X = coords[ind-1]
     b = d[:, ind]
 
-    da = xr.DataArray(b, coords=[('Z', Z), ('X', X)])
+    with _phase('output'):
+        da = xr.DataArray(b, coords=[('Z', Z), ('X', X)])
     da.coords['Z'].attrs['units'] = 's'
     da.coords['X'].attrs['units'] = 'mm'
     return da
+
+
+def sweep(pattern, values, kind='true_cscan', dim='parameter', name='amplitude', workers=None):
+    """
+    Reads the files of a CIVA parametric study, which share the same grid, into one
+    `xarray.Dataset` with a parameter dimension.
+
+    The grid of each file is checked against the grid of the first file from its header only,
+    before its data is parsed, and the data of each file is written into one preallocated
+    array.
+
+    Parameters
+    ----------
+    pattern : str or list
+        The files of the study. Either a string with a `{}` placeholder replaced by each
+        parameter value (e.g. `'study/angle_{}.grid'`), a glob pattern matching one file per
+        parameter value (the files are sorted by name), or a list of file names.
+
+    values : array_like
+        The value of the parameter for each file.
+
+    kind : str, optional
+        The type of the files: `'cscan'`, `'true_cscan'` or `'bscan'`.
+
+    dim : str, optional
+        Name of the parameter dimension.
+
+    name : str, optional
+        Name of the data variable in the Dataset.
+
+    workers : int, optional
+        Number of processes parsing the files. If None or 1, the files are parsed in the
+        current process.
+
+    Returns
+    -------
+    : xarray.Dataset
+        The Dataset, with the parameter dimension first, followed by the dimensions of the
+        files, e.g. (`parameter`, Y, X) for C-scans.
+    """
+    if kind not in _SWEEP_READERS:
+        raise ValueError('Unsupported CIVA file type for sweeps: {}'.format(kind))
+    values = np.asarray(values)
+    if isinstance(pattern, str):
+        if '{}' in pattern:
+            fnames = [pattern.format(v) for v in values]
+        else:
+            fnames = sorted(glob(pattern))
+    else:
+        fnames = list(pattern)
+    if len(fnames) != len(values):
+        raise ValueError('Found {} files for {} parameter values.'.format(len(fnames),
+                                                                          len(values)))
+
+    # the first file gives the grid and the layout of the Dataset
+    grid = _sweep_grid(kind, fnames[0])
+    first = _SWEEP_READERS[kind](fnames[0])
+    data = np.full((len(fnames),) + first.shape, np.nan)
+    _add_array(data)
+    data[0] = first.values
+
+    tasks = [(kind, fname, grid) for fname in fnames[1:]]
+    if workers is None or workers <= 1:
+        results = map(_sweep_read, tasks)
+        _fill_sweep(data, first, fnames, results)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(tasks) // (4 * workers))
+            _fill_sweep(data, first, fnames, executor.map(_sweep_read, tasks,
+                                                          chunksize=chunksize))
+
+    coords = {dim: values}
+    for c in first.dims:
+        coords[c] = first.coords[c].values
+    ds = xr.Dataset({name: ((dim,) + first.dims, data)}, coords=coords)
+    for c in first.dims:
+        ds.coords[c].attrs.update(first.coords[c].attrs)
+    return ds
+
+
+_SWEEP_READERS = {'cscan': cscan, 'true_cscan': true_cscan, 'bscan': bscan}
+
+
+def _sweep_grid(kind, fname):
+    """ Reads the grid of a file from its header, or None if it has no grid header."""
+    if kind == 'true_cscan':
+        return _cached(fname, ('civa_true_cscan',), lambda: _true_cscan_header(fname))
+    if kind == 'bscan':
+        return _cached(fname, ('civa_bscan', 18), lambda: _bscan_header(fname, 18))
+    return None
+
+
+def _sweep_read(task):
+    """
+    Reads one file of a sweep, after checking its grid. Returns the values and the axes of the
+    data, which are only checked for files without a grid header.
+    """
+    kind, fname, grid = task
+    if grid is not None:
+        this = _sweep_grid(kind, fname)
+        if any(a.shape != b.shape or not np.allclose(a, b) for a, b in zip(this, grid)):
+            raise ValueError('The grid of {} is different from the first file.'.format(fname))
+    da = _SWEEP_READERS[kind](fname)
+    return da.values, [da.coords[c].values for c in da.dims]
+
+
+def _fill_sweep(data, first, fnames, results):
+    """ Writes the results of the files after the first one into the sweep array."""
+    for i, (vals, axes) in enumerate(results, 1):
+        if vals.shape != first.shape or \
+                any(not np.allclose(a, first.coords[c].values) for a, c in zip(axes, first.dims)):
+            raise ValueError('The grid of {} is different from the first file.'.format(
+                fnames[i]))
+        data[i] = vals
+
+
+def _true_cscan_header(file_name):
+    """
+    Reads the header lines of a CIVA True C-scan file, and returns the X and Y grid
+    coordinates.
+    """
+    with open(file_name) as fid:
+        parts = fid.readline().split(';')
+        xlims = [float(parts[1]), float(parts[2])]
+        ylims = [float(parts[3]), float(parts[4])]
+
+        # skip next line
+        fid.readline()
+        xstep = float(fid.readline().split(';')[1])
+        ystep = float(fid.readline().split(';')[1])
+
+    nx = int(np.round((xlims[1] - xlims[0])/xstep))
+    ny = int(np.round((ylims[1] - ylims[0])/ystep))
+    X = np.arange(nx)*xstep + xlims[0]
+    Y = np.arange(ny)*ystep + ylims[0]
+    return X, Y
+
+
+def _rows_in_window(rows, sel, scale):
+    """
+    Filters the data rows of a file, keeping the rows with the value of the first column (times
+    `scale`) inside the region of interest `sel`. Only the first column of the rows is parsed,
+    and the iteration stops after the end of the window, as the first column is increasing.
+    """
+    for row in rows:
+        if not row.strip():
+            continue
+        value = float(row.split(';', 1)[0])*scale
+        if sel.start is not None and value < sel.start:
+            continue
+        if sel.stop is not None and value > sel.stop:
+            break
+        yield row
+
+
+def _bscan_header(file_name, skip_lines):
+    """
+    Reads the header of CIVA B-scan and beam files, up to the line which holds the column
+    labels. Returns the numeric values found in the labels line, and the indices of the value
+    columns.
+    """
+    with open(file_name) as fid:
+        for i, line in enumerate(fid):
+            if i == skip_lines-1:
+                coords = re.findall(r'\d*\.?\d+', line)
+                coords = np.array([float(val) for val in coords])
+                cols = line.split(';')
+                ind = np.array([j for j, c in enumerate(cols) if 'val' in c])
+                return coords, ind
+    raise IOError('File header is shorter than expected. Not a CIVA B-scan file.')
@@ -0,0 +1,68 @@
+"""
+Command line interface of the readers package. Run ``readers --help`` (or
+``python -m readers --help``) for usage.
+"""
+import argparse
+import glob
+import os
+import sys
+
+from .convert import CHUNKS, convert_files
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(prog='readers',
+                                     description='Tools for ultrasound data exports.')
+    commands = parser.add_subparsers(dest='command')
+
+    conv = commands.add_parser('convert',
+                               help='Convert files into chunked Zarr or HDF5 stores.')
+    conv.add_argument('inputs', nargs='+',
+                      help='Input files, or glob patterns of input files.')
+    conv.add_argument('-o', '--outdir', default='.',
+                      help='Directory where the output stores are written (default: current).')
+    conv.add_argument('-b', '--backend', choices=['zarr', 'hdf5'], default='zarr',
+                      help='Output store format (default: zarr).')
+    conv.add_argument('-c', '--chunks', default=None, metavar='X,Y,Z',
+                      help='Chunk size along the X, Y and Z axes (default: {X},{Y},{Z}).'
+                           .format(**CHUNKS))
+    conv.add_argument('-j', '--workers', type=int, default=1,
+                      help='Number of files converted in parallel (default: 1).')
+    conv.add_argument('--fs', type=float, default=None,
+                      help='Sampling frequency (Hz) of UltraVision files.')
+
+    args = parser.parse_args(argv)
+    if args.command != 'convert':
+        parser.print_help()
+        return 2
+
+    chunks = None
+    if args.chunks is not None:
+        try:
+            chunks = dict(zip('XYZ', (int(c) for c in args.chunks.split(','))))
+        except ValueError:
+            parser.error('chunks must be integers separated by commas.')
+
+    fnames = []
+    for pattern in args.inputs:
+        matches = sorted(glob.glob(pattern))
+        fnames += matches if matches else [pattern]
+
+    if not os.path.isdir(args.outdir):
+        os.makedirs(args.outdir)
+
+    results = convert_files(fnames, args.outdir, backend=args.backend, chunks=chunks,
+                            fs=args.fs, workers=args.workers)
+    failed = 0
+    for fname, res in results.items():
+        if isinstance(res, Exception):
+            failed += 1
+            status = 'failed ({}: {})'.format(type(res).__name__, res)
+        else:
+            status = 'converted' if res else 'skipped (already converted)'
+        print('{}: {}'.format(fname, status))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
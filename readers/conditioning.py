@@ -0,0 +1,222 @@
+"""
+Signal conditioning applied by the readers while the samples are decoded. A band-pass filter
+and envelope detection along the time (Z) axis are usually the first processing done on the
+A-scans. Done after reading, they take a separate pass over the data and several temporary
+arrays of its full size. Given to a reader, a :class:`Conditioning` is instead applied to each
+chunk of A-scans as it is decoded, and writes the result directly into the output array::
+
+    cond = readers.Conditioning(band=(2e6, 8e6), envelope=True)
+    scan, header = readers.saft(fname, condition=cond)
+
+The filter is applied in the frequency domain, with one forward and one inverse FFT per chunk,
+the band-pass and the Hilbert transform of the envelope being combined into a single spectral
+weight. The weights are computed once for each length and sampling interval, and reused for
+all the chunks and reads. Records longer than `CHUNK_SIZE` samples, such as long oscilloscope
+captures, are filtered by overlap-save with a `KERNEL_SIZE` samples long impulse response, so
+the temporary arrays have the size of a block rather than of the record.
+"""
+import functools
+import numpy as np
+
+
+# maximum number of samples filtered at once. Records longer than this are filtered in blocks
+CHUNK_SIZE = 2**20
+
+# length of the impulse response of the filter applied to records longer than CHUNK_SIZE
+KERNEL_SIZE = 2**12 - 1
+
+
+class Conditioning(object):
+    """
+    Band-pass filter and envelope detection of the A-scans, applied along the last (time) axis.
+
+    Parameters
+    ----------
+    band : tuple, optional
+        The (low, high) cutoff frequencies of the band-pass filter, in the inverse of the units
+        of the Z axis (Hz for a time axis in seconds). Either can be None to have only a
+        high-pass or low-pass filter. If None, the samples are not filtered.
+
+    envelope : bool, optional
+        If True, the envelope (magnitude of the analytic signal) of the filtered A-scans is
+        returned.
+
+    taper : float, optional
+        Width of the raised cosine transitions at the edges of the pass band, as a fraction of
+        the band width. 0 gives an ideal (rectangular) filter, which rings near sharp echoes.
+
+    dtype : str or numpy.dtype, optional
+        Type of the conditioned samples returned by the readers.
+    """
+    def __init__(self, band=None, envelope=False, taper=0.1, dtype='float32'):
+        if band is not None:
+            band = tuple(band)
+            if len(band) != 2:
+                raise ValueError('band should be a (low, high) pair of frequencies.')
+            if None not in band and band[0] >= band[1]:
+                raise ValueError('The low cutoff frequency should be below the high cutoff.')
+        if not 0 <= taper <= 1:
+            raise ValueError('taper should be between 0 and 1.')
+        self.band = band
+        self.envelope = envelope
+        self.taper = taper
+        self.dtype = np.dtype(dtype)
+
+    def __repr__(self):
+        return 'Conditioning(band={}, envelope={}, taper={}, dtype={})'.format(
+            self.band, self.envelope, self.taper, self.dtype)
+
+    def apply(self, data, dz, out=None):
+        """
+        Conditions the A-scans of an array along its last axis, a chunk of A-scans at a time.
+
+        Parameters
+        ----------
+        data : array_like
+            The samples, with time along the last axis.
+
+        dz : float
+            The sampling interval of the last axis.
+
+        out : numpy.ndarray, optional
+            Array of the same shape as `data` receiving the result. If not given, an array of
+            type `dtype` is allocated.
+
+        Returns
+        -------
+        : numpy.ndarray
+            The conditioned samples.
+        """
+        data = np.asanyarray(data)
+        if out is None:
+            out = np.empty(data.shape, dtype=self.dtype)
+        if data.ndim <= 1 or data.shape[-1] == 0:
+            if data.ndim == 1 and len(data) > CHUNK_SIZE and \
+                    (self.band is not None or self.envelope):
+                return self._filter_long(data, dz, out)
+            out[...] = self._filter(data, dz)
+            return out
+
+        line_size = int(np.prod(data.shape[1:]))
+        if line_size > CHUNK_SIZE:
+            # a single line along the first axis is too large, split the next axis
+            for i in range(data.shape[0]):
+                self.apply(data[i], dz, out=out[i])
+            return out
+
+        step = max(1, CHUNK_SIZE // max(line_size, 1))
+        for i in range(0, data.shape[0], step):
+            out[i:i+step] = self._filter(data[i:i+step], dz)
+        return out
+
+    def _filter_long(self, data, dz, out):
+        """
+        Filters a record longer than `CHUNK_SIZE` by overlap-save: the record is convolved
+        block by block with the `KERNEL_SIZE` samples long impulse response of the filter, so
+        that the FFTs and temporary arrays have the size of a block instead of the record.
+        The output is delayed to be aligned with the input, and the record is padded with
+        zeros at both ends, as for shorter records.
+        """
+        n, m = len(data), KERNEL_SIZE
+        pad = m // 2
+        nfft = _next_fast_len(max(4*m, CHUNK_SIZE // 16))
+        hop = nfft - m + 1
+        spec = _kernel(nfft, m, float(dz), self.band, self.envelope, self.taper)
+        seg = np.zeros(nfft)
+        for i in range(0, n, hop):
+            # input samples needed for the outputs i to i + hop
+            start = i - pad
+            a, b = max(start, 0), min(start + nfft, n)
+            seg[:] = 0
+            seg[a - start:b - start] = data[a:b]
+            k = min(hop, n - i)
+            if self.envelope:
+                y = np.abs(np.fft.ifft(np.fft.fft(seg)*spec)[m - 1:m - 1 + k])
+            else:
+                y = np.fft.irfft(np.fft.rfft(seg)*spec, nfft)[m - 1:m - 1 + k]
+            out[i:i + k] = y
+        return out
+
+    def _filter(self, data, dz):
+        """ Filters a chunk of A-scans, with a single forward and inverse FFT."""
+        n = data.shape[-1]
+        if n == 0 or (self.band is None and not self.envelope):
+            return data
+        nfft = _next_fast_len(n)
+        w = _weights(nfft, float(dz), self.band, self.envelope, self.taper)
+        spec = np.fft.rfft(data, nfft, axis=-1)
+        spec *= w
+        if not self.envelope:
+            return np.fft.irfft(spec, nfft, axis=-1)[..., :n]
+        # the analytic signal has no negative frequencies, its spectrum is the one-sided
+        # spectrum of the signal padded with zeros
+        full = np.zeros(spec.shape[:-1] + (nfft,), dtype=spec.dtype)
+        full[..., :spec.shape[-1]] = spec
+        return np.abs(np.fft.ifft(full, axis=-1)[..., :n])
+
+
+@functools.lru_cache(maxsize=64)
+def _next_fast_len(n):
+    """ Smallest length greater or equal to `n` with only 2, 3 and 5 as prime factors."""
+    best = 1 << (n - 1).bit_length() if n > 1 else 1
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            m = p35
+            while m < n:
+                m *= 2
+            best = min(best, m)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+@functools.lru_cache(maxsize=64)
+def _weights(nfft, dz, band, envelope, taper):
+    """
+    Spectral weights of the one-sided spectrum of length `nfft`: the band-pass response, times
+    the Hilbert transform weights (2 for positive frequencies) if `envelope` is True.
+    """
+    f = np.fft.rfftfreq(nfft, dz)
+    w = np.ones(len(f))
+    if band is not None:
+        low, high = band
+        width = taper * ((high if high is not None else f[-1]) -
+                         (low if low is not None else 0.))
+        if low is not None:
+            w *= _edge(f - low, width)
+        if high is not None:
+            w *= _edge(high - f, width)
+    if envelope:
+        w[1:(nfft + 1)//2] *= 2
+    w.setflags(write=False)
+    return w
+
+
+@functools.lru_cache(maxsize=16)
+def _kernel(nfft, m, dz, band, envelope, taper):
+    """
+    Spectrum, over `nfft` points, of the `m` samples long (`m` odd) impulse response of the
+    filter, delayed by `m // 2` samples to be causal. The response is complex (analytic) if
+    `envelope` is True, and the full spectrum is returned. Otherwise, the one-sided spectrum of
+    the real response is returned.
+    """
+    w = _weights(m, dz, band, envelope, taper)
+    if envelope:
+        full = np.zeros(m, dtype=complex)
+        full[:len(w)] = w
+        h = np.roll(np.fft.ifft(full), m // 2)
+        spec = np.fft.fft(h, nfft)
+    else:
+        h = np.roll(np.fft.irfft(w, m), m // 2)
+        spec = np.fft.rfft(h, nfft)
+    spec.setflags(write=False)
+    return spec
+
+
+def _edge(d, width):
+    """ Raised cosine transition from 0 to 1, over `width` centered on d=0."""
+    if width <= 0:
+        return (d >= 0).astype(float)
+    return 0.5 + 0.5*np.sin(np.pi*np.clip(d/width, -0.5, 0.5))
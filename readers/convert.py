@@ -0,0 +1,394 @@
+"""
+Converts files read by this package into chunked and compressed Zarr or HDF5 stores. The data is
+streamed from the input file into the store one slab at a time, so the whole dataset is never
+held in memory.
+
+Each data block is written as a variable `data`, together with its coordinate axes `X`, `Y`
+and/or `Z`, following the layout used by `xarray`, so a store can be opened back with
+`xarray.open_zarr` (or `xarray.open_dataset(..., engine='h5netcdf')` for HDF5 stores). Files
+with multiple data blocks (UltraVision exports with multiple channels) get one group per
+block, named after the channel.
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+
+from . import civa
+from .catalog import _detect
+from .lecroy import _read_wavedesc
+from .saft import NHEADER as SAFT_NHEADER, _read_file_header as _read_saft_header, _recenter
+from .pool import _get_map
+from .ultravision import (_read_header, _read_block, _skip_lines, _process_header, _read_magic,
+                          _map_block)
+
+
+# default chunk size along each axis
+CHUNKS = {'X': 64, 'Y': 16, 'Z': 512}
+
+# A data block to be written in the store.
+#   name: group name of the block, None to write it at the root of the store
+#   dims: names of the dimensions of the data
+#   shape, dtype: shape and data type of the data
+#   coords: dict of coordinate name -> (values, units)
+#   attrs: dict of header fields stored as attributes of the data
+#   axis: the axis along which the data is streamed
+#   slabs: function of the index along `axis` to resume from, returning a generator of
+#          (start, array) tuples, with array the data from start along `axis`
+_Block = namedtuple('_Block', 'name dims shape dtype coords attrs axis slabs')
+
+
+def convert(fname, out, chunks=None, fs=None):
+    """
+    Converts one file into a chunked Zarr or HDF5 store.
+
+    Parameters
+    ----------
+    fname : string
+        The file to convert. The format is detected from the file content.
+
+    out : string
+        Path of the output store. It is written as HDF5 if the extension is `.h5` or `.hdf5`,
+        and as a Zarr directory store otherwise.
+
+    chunks : dict, optional
+        The chunk size along each of the axes `X`, `Y` and `Z`. Missing axes use the default
+        sizes in :data:`CHUNKS`.
+
+    fs : float, optional
+        The sampling frequency for UltraVision files. See :func:`readers.ultravision`.
+
+    Returns
+    -------
+    : bool
+        False if `out` was already completely converted from the same input file, with the same
+        chunks, and was left untouched, True otherwise.
+
+    Notes
+    -----
+    The conversion is resumable: the data array of each block records in its `written`
+    attribute how far along the streamed axis its slabs are written, each block is marked as
+    complete when written, and a store is marked as complete when all its blocks are written.
+    Running the conversion again after an interruption only writes the missing slabs. The
+    chunks are stored in the attributes of the store, and a store written with other chunks is
+    converted again.
+    """
+    chunks = dict(CHUNKS, **(chunks or {}))
+    chunk_sizes = [int(chunks[d]) for d in ('X', 'Y', 'Z')]
+    st = os.stat(fname)
+    source = {'source': os.path.abspath(fname), 'source_size': st.st_size,
+              'source_mtime': st.st_mtime}
+
+    fmt = _detect(fname, st.st_size)
+    if fmt is None:
+        raise ValueError('Unsupported file format: {}'.format(fname))
+
+    store = _open_store(out)
+    try:
+        attrs = store.attrs()
+        if any(attrs.get(key) != val for key, val in source.items()) or \
+                [int(c) for c in attrs.get('chunks', [])] != chunk_sizes:
+            # the store was written from another file, from an older version of it, or with
+            # other chunks
+            store.clear()
+        elif attrs.get('complete', False):
+            return False
+        store.set_attrs(dict(source, format=fmt, chunks=chunk_sizes, complete=False))
+
+        for block in _SOURCES[fmt](fname, chunks, fs):
+            group = store.group(block.name)
+            if store.attrs(group).get('complete', False):
+                continue
+            _write_block(store, group, block, chunks)
+            store.set_attrs({'complete': True}, group)
+        store.set_attrs({'complete': True})
+    finally:
+        store.close()
+    return True
+
+
+def convert_files(fnames, outdir, backend='zarr', chunks=None, fs=None, workers=None):
+    """
+    Converts multiple files, in parallel. The output stores are written in `outdir`, with the
+    same name as the input files and the extension of the `backend` (`.zarr` or `.h5`).
+
+    Returns
+    -------
+    : dict
+        The result of :func:`convert` for each input file, or the exception raised while
+        converting it.
+    """
+    ext = {'zarr': '.zarr', 'hdf5': '.h5'}[backend]
+    outs = [os.path.join(outdir, os.path.splitext(os.path.basename(f))[0] + ext) for f in fnames]
+
+    if workers is None or workers <= 1:
+        return {f: _convert_safe(f, o, chunks, fs) for f, o in zip(fnames, outs)}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_convert_safe, f, o, chunks, fs) for f, o in zip(fnames, outs)]
+        return {f: fut.result() for f, fut in zip(fnames, futures)}
+
+
+def _convert_safe(fname, out, chunks, fs):
+    try:
+        return convert(fname, out, chunks=chunks, fs=fs)
+    except Exception as e:
+        return e
+
+
+def _write_block(store, group, block, chunks):
+    data_chunks = tuple(min(chunks.get(d, n), n) for d, n in zip(block.dims, block.shape))
+    written = 0
+    if 'data' in group:
+        arr = group['data']
+        if (tuple(arr.shape) == tuple(block.shape) and arr.dtype == block.dtype
+                and tuple(arr.chunks) == data_chunks):
+            # an interrupted conversion, with the same slabs
+            written = store.attrs(arr).get('written', 0)
+
+    if written == 0:
+        for dim, (values, units) in block.coords.items():
+            store.write_coord(group, dim, values, units)
+        arr = store.create(group, 'data', block.dims, block.shape, block.dtype, data_chunks)
+        store.set_attrs({k: _jsonable(v) for k, v in block.attrs.items()}, arr)
+        store.attach_coords(group, arr, block.dims)
+
+    index = [slice(None)] * len(block.shape)
+    for start, slab in block.slabs(written):
+        stop = start + slab.shape[block.axis]
+        index[block.axis] = slice(start, stop)
+        arr[tuple(index)] = slab
+        # the slab must be on disk before it is marked as written
+        store.flush()
+        store.set_attrs({'written': stop}, arr)
+
+
+def _jsonable(val):
+    """ Converts header values to types that can be stored as attributes in all stores. """
+    if isinstance(val, (bool, np.bool_)):
+        return bool(val)
+    if isinstance(val, (int, np.integer)):
+        return int(val)
+    if isinstance(val, (float, np.floating)):
+        return float(val)
+    if isinstance(val, datetime):
+        return val.isoformat()
+    return str(val)
+
+
+# ----------------------------------------------------------------------------------------------
+# Sources: each yields the data blocks of a file, streaming the data in slabs along one axis
+# ----------------------------------------------------------------------------------------------
+def _saft_source(fname, chunks, fs):
+    header = _read_saft_header(fname)
+    raw_type = np.dtype('<u2' if header['data_16bit'] else 'u1')
+    out_type = np.dtype('int16' if header['data_16bit'] else 'int8')
+    header['data_offset'] = 2**(8*raw_type.itemsize - 1)
+    nx, ny, ns = header['scan_xpoints'], header['scan_ypoints'], header['samp_ascan_length']
+    len_data_header = 2**5 // raw_type.itemsize
+
+    raw = np.frombuffer(_get_map(fname), dtype=raw_type, count=ny*nx*(ns + len_data_header),
+                        offset=SAFT_NHEADER).reshape(ny, nx, ns + len_data_header)
+    # same axes as in readers.saft
+    fs_saft = ns*1e9/(header['samp_windowstop_ns'] - header['samp_windowstart_ns'])
+    t = header['samp_windowstart_ns']*1e-9 + np.arange(ns)/fs_saft
+    X = np.arange(nx)*header['scan_xstep_in']*25.4e-3
+    Y = np.arange(ny)*header['scan_ystep_in']*25.4e-3
+
+    def slabs(begin):
+        step = min(chunks['Y'], ny)
+        for start in range(begin, ny, step):
+            # copy out of the memory map, and remove the offset of the unsigned samples
+            slab = _recenter(np.array(raw[start:start + step, :, len_data_header:]))
+            yield start, slab.transpose(1, 0, 2)
+
+    yield _Block(None, ('X', 'Y', 'Z'), (nx, ny, ns), out_type,
+                 {'X': (X, 'm'), 'Y': (Y, 'm'), 'Z': (t, 's')}, header, 1, slabs)
+
+
+def _lecroy_source(fname, chunks, fs):
+    with open(fname, 'rb') as fid:
+        info, desc = _read_wavedesc(fid)
+    info['filename'] = fname
+    raw_type = np.dtype(desc['fmt'] + ('i2' if desc['comm_type'] else 'i1'))
+    n = desc['wave_array_1'] // raw_type.itemsize
+    raw = np.frombuffer(_get_map(fname), dtype=raw_type, count=n, offset=desc['header_len'])
+    Z = np.arange(1, n + 1)*desc['horiz_interval'] + desc['horiz_offset']
+
+    def slabs(begin):
+        # stream along the time axis in multiples of the chunk size
+        step = min(chunks['Z'], n) * 64
+        for start in range(begin, n, step):
+            yield start, desc['vertical_gain']*raw[start:start + step] - desc['vertical_offset']
+
+    yield _Block(None, ('Z',), (n,), np.dtype('float64'), {'Z': (Z, 's')}, info, 0, slabs)
+
+
+def _ultravision_source(fname, chunks, fs):
+    names = set()
+    with open(fname, 'rb') as fid:
+        dtype = _read_magic(fid)
+        while True:
+            header = _read_header(fid)
+            if header is None:
+                break
+            h = _process_header(header, fs)
+            nx, ny, nz = len(h['x']), len(h['y']), len(h['z'])
+            start = fid.tell()
+            state = {'done': False}
+
+            def slabs(begin, nx=nx, ny=ny, nz=nz, start=start, state=state):
+                step = min(chunks['Y'], ny)
+                if dtype is not None:
+                    view = _map_block(fname, start, dtype, nx, ny, nz)
+                else:
+                    # the text rows already written are read past
+                    _skip_lines(fid, nx * begin)
+                for iy in range(begin, ny, step):
+                    if dtype is None:
+                        yield iy, _read_block(fid, nx, min(step, ny - iy), nz)
+                    else:
+                        yield iy, view[:, iy:iy + step]
+                state['done'] = True
+
+            # same naming of channels as in readers.ultravision
+            n, key = 1, h['channel']
+            while key in names:
+                key = h['channel'] + '_{}'.format(n)
+                n += 1
+            names.add(key)
+
+            attrs = dict(header)
+            # binary samples are stored with their own type
+            yield _Block(key, ('X', 'Y', 'Z'), (nx, ny, nz), dtype or np.dtype('float64'),
+                         {'X': (h['x'], h['units']['x']), 'Y': (h['y'], h['units']['y']),
+                          'Z': (h['z'], h['units']['z'])}, attrs, 1, slabs)
+
+            # move to the next block, whether the data was read or skipped
+            if dtype is not None:
+                fid.seek(start + nx * ny * nz * dtype.itemsize)
+            elif not state['done']:
+                fid.seek(start)
+                _skip_lines(fid, nx * ny)
+
+
+def _civa_source(reader):
+    def source(fname, chunks, fs):
+        da = reader(fname)
+        coords = {d: (da.coords[d].values, da.coords[d].attrs.get('units')) for d in da.dims}
+        # the data is written in a single slab
+        yield _Block(None, da.dims, da.shape, da.dtype, coords, {}, 0,
+                     lambda begin: iter([(0, da.values)]))
+    return source
+
+
+_SOURCES = {'saft': _saft_source,
+            'lecroy': _lecroy_source,
+            'ultravision': _ultravision_source,
+            'civa_cscan': _civa_source(civa.cscan),
+            'civa_true_cscan': _civa_source(civa.true_cscan),
+            'civa_bscan': _civa_source(civa.bscan)}
+
+
+# ----------------------------------------------------------------------------------------------
+# Stores
+# ----------------------------------------------------------------------------------------------
+def _open_store(out):
+    if os.path.splitext(out)[1].lower() in ('.h5', '.hdf5'):
+        return _HDF5Store(out)
+    return _ZarrStore(out)
+
+
+class _ZarrStore(object):
+    """ Zarr directory store, written with the conventions of `xarray.open_zarr`. """
+    def __init__(self, path):
+        try:
+            import zarr
+        except ImportError:
+            raise ImportError('zarr is required to write Zarr stores.')
+        self.root = zarr.open_group(path, mode='a')
+
+    def attrs(self, obj=None):
+        return dict((self.root if obj is None else obj).attrs)
+
+    def set_attrs(self, attrs, obj=None):
+        (self.root if obj is None else obj).attrs.update(attrs)
+
+    def clear(self):
+        for name in list(self.root.keys()):
+            del self.root[name]
+        self.root.attrs.clear()
+
+    def group(self, name):
+        return self.root if name is None else self.root.require_group(name)
+
+    def create(self, group, name, dims, shape, dtype, chunks):
+        arr = group.create_dataset(name, shape=shape, chunks=chunks, dtype=dtype,
+                                   overwrite=True)
+        arr.attrs['_ARRAY_DIMENSIONS'] = list(dims)
+        return arr
+
+    def write_coord(self, group, name, values, units):
+        arr = group.array(name, values, overwrite=True)
+        arr.attrs['_ARRAY_DIMENSIONS'] = [name]
+        if units is not None:
+            arr.attrs['units'] = units
+
+    def attach_coords(self, group, arr, dims):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _HDF5Store(object):
+    """ HDF5 store, with the coordinates attached as dimension scales. """
+    def __init__(self, path):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError('h5py is required to write HDF5 stores.')
+        self.root = h5py.File(path, 'a')
+
+    def attrs(self, obj=None):
+        return dict((self.root if obj is None else obj).attrs)
+
+    def set_attrs(self, attrs, obj=None):
+        (self.root if obj is None else obj).attrs.update(attrs)
+
+    def clear(self):
+        for name in list(self.root.keys()):
+            del self.root[name]
+        self.root.attrs.clear()
+
+    def group(self, name):
+        return self.root if name is None else self.root.require_group(name)
+
+    def create(self, group, name, dims, shape, dtype, chunks):
+        if name in group:
+            del group[name]
+        return group.create_dataset(name, shape=shape, dtype=dtype, chunks=chunks,
+                                    compression='gzip', shuffle=True)
+
+    def write_coord(self, group, name, values, units):
+        if name in group:
+            del group[name]
+        ds = group.create_dataset(name, data=values)
+        if units is not None:
+            ds.attrs['units'] = units
+        ds.make_scale(name)
+
+    def attach_coords(self, group, arr, dims):
+        for i, dim in enumerate(dims):
+            if dim in group:
+                arr.dims[i].attach_scale(group[dim])
+
+    def flush(self):
+        self.root.flush()
+
+    def close(self):
+        self.root.close()
@@ -0,0 +1,192 @@
+"""
+Compact header classes for the supported formats. The header fields are stored in `__slots__`
+instead of a per instance `dict`, which takes several times less memory when the headers of
+many files are kept, e.g. in :func:`readers.scan_catalog`.
+
+The headers behave as dictionaries (`header['scan_xpoints']`, `keys()`, `items()`,
+...), and fields can be assigned with `header[key] = value`, so that code written for the
+previous `dict` headers keeps working. Use :func:`collect` to gather many headers of the same
+format into one `pandas.DataFrame`, with one column per field.
+"""
+import re
+from collections.abc import Mapping
+import pandas as pd
+
+
+def _slot_names(keys):
+    """ Attribute names for the header keys, which are not all valid identifiers."""
+    return tuple(re.sub(r'\W', '_', key) for key in keys)
+
+
+class Header(Mapping):
+    """
+    Base class of the headers. Subclasses list their fields in `_keys`, and declare the
+    matching `__slots__` with :func:`_slot_names`. Fields which are not in `_keys` are stored
+    in a `dict`, only created when such a field is set.
+    """
+    __slots__ = ('_extra',)
+    _keys = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._slot_of = dict(zip(cls._keys, _slot_names(cls._keys)))
+
+    def __init__(self, *args, **kwargs):
+        self._extra = None
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        slot = self._slot_of.get(key)
+        if slot is None:
+            if self._extra is None:
+                raise KeyError(key)
+            return self._extra[key]
+        try:
+            return getattr(self, slot)
+        except AttributeError:
+            # the field was not set
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        slot = self._slot_of.get(key)
+        if slot is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+        else:
+            setattr(self, slot, value)
+
+    def __iter__(self):
+        for key, slot in self._slot_of.items():
+            if hasattr(self, slot):
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, dict(self))
+
+    def __getstate__(self):
+        # a tuple of the field values, and the indices of the fields which are not set
+        slots = self._slot_of.values()
+        values = tuple(getattr(self, slot, None) for slot in slots)
+        missing = tuple(i for i, slot in enumerate(slots) if not hasattr(self, slot))
+        return values, missing, self._extra
+
+    def __setstate__(self, state):
+        values, missing, self._extra = state
+        missing = set(missing)
+        for i, (slot, value) in enumerate(zip(self._slot_of.values(), values)):
+            if i not in missing:
+                setattr(self, slot, value)
+
+    def to_dict(self):
+        """ Returns the header fields as a `dict`."""
+        return dict(self)
+
+
+class SaftHeader(Header):
+    """
+    Header of a SAFT file, as read by :func:`readers.saft`. The fields are described in
+    :func:`readers.saft._read_header`.
+    """
+    _keys = (
+        'ascii', 'title', 'date', 'time', 'data_domain', 'data_nsets', 'data_min', 'data_max',
+        'data_avg', 'data_projection', 'data_units', 'data_16bit', 'data_scal_filename',
+        'probe_comment', 'probe_freq_mhz', 'probe_rxWedgePath_in', 'probe_txWedgePath_in',
+        'probe_rxWedgeVel_in/s', 'probe_txWedgeVel_in/s', 'probe_beamDia_in',
+        'probe_refracted_deg', 'probe_incident_deg', 'probe_skew_deg', 'probe_mode',
+        'probe_init_xoffset_in', 'probe_fnumber', 'probe_xoffset_wedge', 'probe_yoffset_wedge',
+        'probe_reserved', 'mat_comment', 'mat_velocity_in/s', 'mat_refracted_deg',
+        'mat_thickness_in', 'mat_pipeDia_in', 'mat_trackDia_in', 'mat_type', 'mat_reserved',
+        'samp_comment', 'samp_delayinc_ns', 'samp_initdelay_ns', 'samp_ascan_length',
+        'samp_start_in', 'samp_stop_in', 'samp_averages', 'samp_pulsetime',
+        'samp_step_wavepath_in', 'samp_windowstart_ns', 'samp_windowstop_ns',
+        'samp_depthend_window', 'scan_comment', 'scan_dir_deg', 'scan_xstart_in',
+        'scan_ystart_in', 'scan_xstop_in', 'scan_ystop_in', 'scan_xstep_in', 'scan_ystep_in',
+        'scan_xpoints', 'scan_ypoints', 'scan_isdownstream', 'scan_tx_half_vees',
+        'scan_rx_half_vees', 'scan_num_halfvees', 'scan_init_pos', 'scan_final_pos',
+        'scan_toward_track', 'scan_scannertype', 'scan_pattern', 'scan_zincrement',
+        'processing', 'nozzle', 'other', 'TVG', 'digi_type', 'TVG_type', 'pulser_type', 'vpp',
+        'sync_mode', 'other2',
+        # set by readers.saft
+        'sampling_rate', 'data_offset')
+    __slots__ = _slot_names(_keys)
+
+
+class LecroyInfo(Header):
+    """ Information about a LeCroy acquisition, described in :func:`readers.lecroy`."""
+    _keys = ('instrument_name', 'instrument_number', 'filename', 'trigger_time', 'channel',
+             'coupling', 'bandwidth_limit', 'record_type', 'processing', 'nominal_bits',
+             'gain_with_probe', 'timebase', 'Fs', 'Ts', 'nb_segments')
+    __slots__ = _slot_names(_keys)
+
+
+class UltravisionHeader(Header):
+    """
+    Header of a block (channel) of an UltraVision text file. The numeric fields are converted
+    to numbers, and the units and qualifiers of the labels (e.g. `USoundStart [True Depth]
+    (mm)`) are kept in the `ScanUnits`, `IndexUnits`, `USoundUnits` and `USoundAxis` fields.
+    `offset` is the position of the block in the file, in bytes.
+    """
+    _keys = ('Version', 'Channel', 'Focal Law', 'Type',
+             'ScanStart', 'ScanQty', 'ScanResol', 'ScanUnits',
+             'IndexStart', 'IndexQty', 'IndexResol', 'IndexUnits',
+             'USoundStart', 'USoundQty', 'USoundResol', 'USoundUnits', 'USoundAxis',
+             'AmplMin', 'AmplMax', 'AmplStart', 'AmplResol', 'Amplitude scale',
+             'Amplitude unit', 'offset')
+    __slots__ = _slot_names(_keys)
+
+    @classmethod
+    def from_split(cls, values, units, qualifiers, offset=None):
+        """ Builds the header from the output of :func:`readers.ultravision._split_header`."""
+        h = cls()
+        for name, value in values.items():
+            if name.endswith('Qty'):
+                value = int(value)
+            else:
+                try:
+                    value = float(value)
+                except ValueError:
+                    pass
+            h[name] = value
+        h['ScanUnits'] = units.get('ScanResol')
+        h['IndexUnits'] = units.get('IndexResol')
+        h['USoundUnits'] = units.get('USoundResol')
+        h['USoundAxis'] = qualifiers.get('USoundStart')
+        h['offset'] = offset
+        return h
+
+
+def collect(headers):
+    """
+    Collects many headers of the same format into a `pandas.DataFrame`, with one row per
+    header and one column per field. Fields which are not set in a header are None.
+
+    Parameters
+    ----------
+    headers : iterable
+        The headers, all of the same class.
+
+    Returns
+    -------
+    : pandas.DataFrame
+    """
+    headers = list(headers)
+    if not headers:
+        return pd.DataFrame()
+    cls = type(headers[0])
+    if any(type(h) is not cls for h in headers):
+        raise ValueError('All headers should be of the same format.')
+    # read the fields column by column, from the slots of all the headers
+    columns = {key: [getattr(h, slot, None) for h in headers]
+               for key, slot in cls._slot_of.items()}
+    out = pd.DataFrame(columns, columns=list(cls._keys))
+    extra = [h._extra or {} for h in headers]
+    if any(extra):
+        out = out.join(pd.DataFrame(extra))
+    return out
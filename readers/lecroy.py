@@ -1,9 +1,15 @@
 from struct import unpack
 import numpy as np
 from datetime import datetime
+from ._utils import _roi_indices
+from .profiling import _profiled, _phase, _add_bytes, _add_array
+from .headers import LecroyInfo
+from .pool import _open
+from .cache import _cached
 
 
-def lecroy(filename):
+@_profiled('lecroy')
+def lecroy(filename, z=None, condition=None):
     """
     Reads binary waveform file (.trc) saved from LeCroy Waverunner Oscilloscope.
 
@@ -12,6 +18,15 @@ def lecroy(filename):
     filename : string
         The LeCroy binary file to be loaded. The full path or absolute path must be given.
 
+    z : slice, optional
+        Region of interest along the horizontal (time) axis, given as `slice(start, stop)` in
+        seconds, with both bounds included. Only the samples inside the region are read from
+        the file.
+
+    condition : readers.Conditioning, optional
+        Band-pass filter and envelope detection applied to the waveform as it is scaled to
+        volts. `wave['y']` then has the type of the conditioning.
+
     Returns
     -------
     wave : Dict
@@ -53,13 +68,66 @@ def lecroy(filename):
     http://qtwork.tudelft.nl/gitdata/users/guen/qtlabanalysis/analysis_modules/general/lecroy.py
     """
 
-    # Define an empty dictionary that will be used to store wave info
-    info = {}
+    # the file is memory mapped once, and the map is shared by repeated reads of the file
+    fid = _open(filename)
+    with _phase('header'):
+        # the header and time axis are decoded once, and then taken from the cache while the
+        # file is unchanged
+        info, desc, x = _cached(filename, ('lecroy',), lambda: _read_metadata(fid))
+        info['filename'] = filename
+
+    with _phase('coords'):
+        itemsize = 2 if desc['comm_type'] else 1
+        zs = _roi_indices(x, z)
+        # the cached axis is read-only
+        x = x[zs].copy()
+
+    # Read the actual data, only the samples inside the region of interest
+    with _phase('parse'):
+        y = _readData(fid, desc['fmt'], desc['header_len'] + zs.start*itemsize,
+                      (zs.stop - zs.start)*itemsize, commtype=desc['comm_type'])
+        _add_bytes(y.nbytes)
+    with _phase('reshape'):
+        y = desc['vertical_gain'] * y - desc['vertical_offset']
+        if condition is not None:
+            y = condition.apply(y, desc['horiz_interval'])
+        _add_array(y)
+    return {'info': info,
+            'x': x,
+            'y': y}
+
+
+def _read_metadata(fid):
+    """ Reads the WAVEDESC block, and computes the horizontal axis of the whole waveform."""
+    info, desc = _read_wavedesc(fid)
+    _add_bytes(desc['header_len'])
+    itemsize = 2 if desc['comm_type'] else 1
+    x = np.arange(1, desc['wave_array_1']//itemsize + 1)*desc['horiz_interval'] + \
+        desc['horiz_offset']
+    return info, desc, x
+
+
+def _read_wavedesc(fid):
+    """
+    Reads the WAVEDESC block of an open LeCroy binary file, without touching the sample array.
+
+    Returns
+    -------
+    : tuple
+        A 2-element tuple. The first element is the `info` dictionary described in
+        :func:`lecroy`. The second element is a dictionary describing the layout of the data
+        block (byte order, sample type, offset and length of the sample array), and the
+        scaling of the vertical and horizontal axes.
+    """
+    # Define an empty header that will be used to store wave info
+    info = LecroyInfo()
 
     # Seek offset in the header block
-    fid = open(filename, "rb")
+    fid.seek(0)
     data = fid.read(50)
-    WAVEDESC = str.find(data.decode('UTF-8'), 'WAVEDESC')
+    WAVEDESC = str.find(data.decode('UTF-8', errors='ignore'), 'WAVEDESC')
+    if WAVEDESC < 0:
+        raise IOError("WAVEDESC block not found. Not a LeCroy binary file.")
 
     # ------------------------------------------------------------------------
     # Define the addresses of the various informations in the file
@@ -128,7 +196,6 @@ def lecroy(filename):
     info['instrument_name'] = _readString(fid, fmt,
                                           aINSTRUMENT_NAME).rstrip('\0')
     info['instrument_number'] = _readLong(fid, fmt, aINSTRUMENT_NUMBER)
-    info['filename'] = filename
 
     # Channel information
     info['trigger_time'] = _readTimeStamp(fid, fmt, aTRIGGER_TIME)
@@ -186,18 +253,15 @@ def lecroy(filename):
     WAVE_ARRAY_1 = _readLong(fid, fmt, aWAVE_ARRAY_1)
     info['nb_segments'] = _readLong(fid, fmt, aSUBARRAY_COUNT)
 
-    fid.close()
-    fid = open(filename, "rb")
-
-    # Read the actual data
-    header_len = WAVEDESC + WAVE_DESCRIPTOR + USER_TEXT + TRIGTIME_array
-    y = _readData(fid, fmt, header_len, WAVE_ARRAY_1, commtype=COMM_TYPE)
-    y = VERTICAL_GAIN * y - VERTICAL_OFFSET
-    x = np.arange(1, len(y)+1)*HORIZ_INTERVAL + HORIZ_OFFSET
-    fid.close()
-    return {'info': info,
-            'x': x,
-            'y': y}
+    desc = {'fmt': fmt,
+            'comm_type': COMM_TYPE,
+            'header_len': WAVEDESC + WAVE_DESCRIPTOR + USER_TEXT + TRIGTIME_array,
+            'wave_array_1': WAVE_ARRAY_1,
+            'vertical_gain': VERTICAL_GAIN,
+            'vertical_offset': VERTICAL_OFFSET,
+            'horiz_interval': HORIZ_INTERVAL,
+            'horiz_offset': HORIZ_OFFSET}
+    return info, desc
 
 
 def _readString(fid, fmt, Addr):
@@ -262,9 +326,10 @@ def _readDouble(fid, fmt, Addr):
 
 
 def _readData(fid, fmt, Addr, datalen, commtype=0):
+    """ Reads `datalen` bytes of samples starting at `Addr`. """
     fid.seek(Addr)
-    data = fid.read()
-    result = np.frombuffer(data, dtype=np.int16 if commtype else np.int8)
+    data = fid.read(datalen)
+    result = np.frombuffer(data, dtype=fmt + ('i2' if commtype else 'i1'))
     return result
 
 
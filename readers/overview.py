@@ -0,0 +1,321 @@
+"""
+Min/max overviews of long LeCroy records and large SAFT volumes, for plotting and browsing
+without loading the full resolution data.
+
+An overview holds several levels of decimation along the time (Z) axis. Each level keeps the
+minimum and maximum sample of bins of `factor`, `factor**2`, ... samples, so that peaks are not
+lost when drawing the envelope of the signal at screen resolution. All the levels are built in
+one pass over the raw integer samples, which are read a chunk at a time from the memory map
+of the file::
+
+    ovr = readers.overview('capture.trc', path='capture.ovr.npz')
+    view = ovr.fetch(z=slice(1e-3, 2e-3), npoints=2000)
+    plt.fill_between(view.Z, view['min'], view['max'])
+
+:meth:`Overview.fetch` returns the coarsest level with at least `npoints` bins in the requested
+range, and reads the samples of the file at full resolution only when the range is short
+enough.
+"""
+import os
+import numpy as np
+import xarray as xr
+
+from ._utils import _roi_indices
+from .catalog import _detect
+from .lecroy import _read_wavedesc
+from .saft import NHEADER as SAFT_NHEADER, _read_metadata as _read_saft_metadata
+from .pool import _get_map, _open
+from .cache import _cached
+from .profiling import _profiled, _phase, _add_bytes
+from .progress import _check, _report
+
+
+# maximum number of samples reduced at once
+CHUNK_SIZE = 2**22
+
+
+@_profiled('overview')
+def overview(fname, factor=8, min_size=1024, path=None, progress=None, cancel=None):
+    """
+    Builds the min/max overview of a LeCroy (.trc) or SAFT file.
+
+    Parameters
+    ----------
+    fname : string
+        The file, in LeCroy binary or SAFT format.
+
+    factor : int, optional
+        Decimation factor between two levels. The first level holds bins of `factor` samples.
+
+    min_size : int, optional
+        Levels are added until the number of bins along Z is at most `min_size`.
+
+    path : string, optional
+        File where the overview is saved (`.npz`). If it exists, and was built from the current
+        version of `fname` (same size and modification time) with the same `factor` and
+        `min_size`, it is loaded instead of being built again.
+
+    progress : callable, optional
+        Called as `progress(done, total)` while the overview is built, with the number of
+        samples reduced so far and the total.
+
+    cancel : readers.CancelToken, optional
+        Checked before each chunk of samples is reduced. When it is set, the build stops and
+        raises :class:`readers.ReadCancelled`.
+
+    Returns
+    -------
+    : Overview
+    """
+    if factor < 2:
+        raise ValueError('The decimation factor should be at least 2.')
+    st = os.stat(fname)
+    source = np.array([st.st_size, st.st_mtime_ns], dtype='int64')
+    if path is not None and os.path.exists(path):
+        ovr = Overview.load(path, fname)
+        if np.array_equal(ovr.source, source) and ovr.factor == factor and \
+                ovr.min_size == min_size:
+            return ovr
+
+    with _phase('header'):
+        fmt = _detect(fname, st.st_size)
+        if fmt not in _SOURCES:
+            raise ValueError('Unsupported file format for overviews: {}'.format(fmt))
+        raw, params = _SOURCES[fmt](fname)
+
+    with _phase('parse'):
+        levels = [_reduce(raw, raw, factor, progress, cancel)]
+        while levels[-1][0].shape[-1] > max(min_size, 1):
+            lo, hi = levels[-1]
+            levels.append(_reduce(lo, hi, factor))
+
+    ovr = Overview(fname, fmt, factor, levels, min_size=min_size, source=source, **params)
+    if path is not None:
+        ovr.save(path)
+    return ovr
+
+
+class Overview(object):
+    """
+    Min/max decimation levels of a LeCroy record or SAFT volume, built by :func:`overview`.
+
+    Attributes
+    ----------
+    fname : string
+        The file the overview was built from.
+
+    fmt : string
+        The format of the file: `'lecroy'` or `'saft'`.
+
+    factor : int
+        Decimation factor between two levels.
+
+    min_size : int
+        Maximum number of bins along Z of the coarsest level.
+
+    levels : list
+        The (min, max) pair of raw sample arrays of each level, from the finest to the
+        coarsest. Level `k` (starting at 1) holds bins of `factor**k` samples along the last
+        axis.
+
+    z0, dz : float
+        Time of the first sample, and sampling interval, in seconds.
+
+    nz : int
+        Number of samples of each record at full resolution.
+
+    scale, offset : float
+        Conversion of the raw samples to values: `raw*scale - offset`.
+
+    X, Y : numpy.ndarray
+        The scan and index axes of SAFT volumes (None for LeCroy records), in meters.
+    """
+    def __init__(self, fname, fmt, factor, levels, z0, dz, nz, scale=1., offset=0., X=None,
+                 Y=None, min_size=None, source=None):
+        self.fname = fname
+        self.fmt = fmt
+        self.factor = factor
+        self.min_size = min_size
+        self.levels = levels
+        self.z0 = z0
+        self.dz = dz
+        self.nz = nz
+        self.scale = scale
+        self.offset = offset
+        self.X = X
+        self.Y = Y
+        self.source = source
+
+    def __repr__(self):
+        return 'Overview({!r}, fmt={}, factor={}, levels={})'.format(
+            self.fname, self.fmt, self.factor, [lo.shape for lo, _ in self.levels])
+
+    def fetch(self, z=None, x=None, y=None, npoints=2048):
+        """
+        Returns the minimum and maximum values over a range, at the coarsest resolution with at
+        least `npoints` bins along Z. If the range has fewer than `factor*npoints` samples,
+        the samples are read from the file, and the minimum and maximum are both equal to
+        the samples.
+
+        Parameters
+        ----------
+        z : slice, optional
+            Time range, in seconds, given as `slice(start, stop)` with both bounds included.
+
+        x, y : slice, optional
+            Scan and index ranges of SAFT volumes, in meters.
+
+        npoints : int, optional
+            Minimum number of bins along Z, usually the width of the plot in pixels.
+
+        Returns
+        -------
+        : xarray.Dataset
+            The `min` and `max` values, with coordinates X, Y (SAFT) and Z. The Z coordinate
+            is the start time of each bin.
+        """
+        i0, i1 = self._z_indices(z)
+        k = 0
+        while k < len(self.levels) and (i1 - i0) // self.factor**(k + 1) >= npoints:
+            k += 1
+
+        lead = ()
+        coords = []
+        if self.fmt == 'saft':
+            xs, ys = _roi_indices(self.X, x), _roi_indices(self.Y, y)
+            lead = (xs, ys)
+            coords = [('X', self.X[xs]), ('Y', self.Y[ys])]
+
+        if k == 0:
+            raw, _ = _SOURCES[self.fmt](self.fname)
+            lo = hi = np.asarray(raw[lead + (slice(i0, i1),)])
+            _add_bytes(lo.nbytes)
+            size, b0 = 1, i0
+        else:
+            size = self.factor**k
+            b0, b1 = i0 // size, -(-i1 // size)
+            lo, hi = (level[lead + (slice(b0, b1),)] for level in self.levels[k - 1])
+
+        lo, hi = lo*self.scale - self.offset, hi*self.scale - self.offset
+        if self.scale < 0:
+            lo, hi = hi, lo
+        coords.append(('Z', self.z0 + (b0 + np.arange(lo.shape[-1]))*size*self.dz))
+        dims = [name for name, _ in coords]
+        ds = xr.Dataset({'min': (dims, lo), 'max': (dims, hi)}, coords=dict(coords))
+        ds.coords['Z'].attrs['units'] = 's'
+        if self.fmt == 'saft':
+            ds.coords['X'].attrs['units'] = 'm'
+            ds.coords['Y'].attrs['units'] = 'm'
+        return ds
+
+    def _z_indices(self, z):
+        """ Range of sample indices inside a time window, without building the time axis."""
+        if z is None:
+            return 0, self.nz
+        if not isinstance(z, slice) or z.step is not None:
+            raise ValueError('The region of interest should be given as slice(start, stop).')
+        i0 = 0 if z.start is None else int(np.ceil((z.start - self.z0)/self.dz - 1e-9))
+        i1 = self.nz if z.stop is None else int(np.floor((z.stop - self.z0)/self.dz + 1e-9)) + 1
+        i0, i1 = min(max(i0, 0), self.nz), min(max(i1, 0), self.nz)
+        return i0, max(i0, i1)
+
+    def save(self, path):
+        """ Saves the overview to a `.npz` file."""
+        arrays = {'meta': np.array([self.factor, self.z0, self.dz, self.nz, self.scale,
+                                    self.offset, self.min_size]),
+                  'fmt': np.array(self.fmt),
+                  'source': self.source}
+        if self.X is not None:
+            arrays.update(X=self.X, Y=self.Y)
+        for k, (lo, hi) in enumerate(self.levels):
+            arrays['min_{}'.format(k)] = lo
+            arrays['max_{}'.format(k)] = hi
+        with open(path, 'wb') as fid:
+            np.savez(fid, **arrays)
+
+    @classmethod
+    def load(cls, path, fname):
+        """ Loads an overview saved with :meth:`save`, built from the file `fname`."""
+        with np.load(path) as f:
+            factor, z0, dz, nz, scale, offset, min_size = f['meta']
+            levels = []
+            while 'min_{}'.format(len(levels)) in f:
+                k = len(levels)
+                levels.append((f['min_{}'.format(k)], f['max_{}'.format(k)]))
+            X, Y = (f['X'], f['Y']) if 'X' in f else (None, None)
+            return cls(fname, str(f['fmt']), int(factor), levels, z0, dz, int(nz), scale,
+                       offset, X=X, Y=Y, min_size=int(min_size), source=f['source'])
+
+
+def _reduce(lo, hi, factor, progress=None, cancel=None):
+    """
+    Computes the min and max of bins of `factor` samples along the last axis, from the min and
+    max of the previous level, or twice the same raw array for the first level. The arrays are
+    reduced a chunk at a time, so a memory mapped array is read only once.
+    """
+    n = lo.shape[-1]
+    nb = -(-n // factor)
+    out_lo = np.empty(lo.shape[:-1] + (nb,), dtype=lo.dtype)
+    out_hi = np.empty(hi.shape[:-1] + (nb,), dtype=hi.dtype)
+    if nb == 0:
+        return out_lo, out_hi
+
+    if lo.ndim == 1:
+        # long records are split along time, in chunks holding whole bins
+        step = max(1, CHUNK_SIZE // factor)*factor
+        chunks = [np.s_[i:i+step] for i in range(0, n, step)]
+        out_chunks = [np.s_[i//factor:(i+step)//factor] for i in range(0, n, step)]
+    else:
+        step = max(1, CHUNK_SIZE // int(np.prod(lo.shape[1:])))
+        chunks = out_chunks = [np.s_[i:i+step] for i in range(0, lo.shape[0], step)]
+
+    bins = np.arange(0, n, factor)
+    done = 0
+    for sel, out_sel in zip(chunks, out_chunks):
+        _check(cancel)
+        c_lo = np.asarray(lo[sel])
+        c_hi = c_lo if hi is lo else np.asarray(hi[sel])
+        idx = bins[:-(-c_lo.shape[-1] // factor)] if lo.ndim == 1 else bins
+        out_lo[out_sel] = np.minimum.reduceat(c_lo, idx, axis=-1)
+        out_hi[out_sel] = np.maximum.reduceat(c_hi, idx, axis=-1)
+        if hi is lo:
+            _add_bytes(c_lo.nbytes)
+        done += c_lo.size
+        _report(progress, done, lo.size)
+    return out_lo, out_hi
+
+
+def _lecroy_source(fname):
+    """ Returns the raw samples of a LeCroy file, mapped without copy, and their scaling."""
+    fid = _open(fname)
+    # the time axis of long records is not built, only its start and step are needed
+    _, desc = _read_wavedesc(fid)
+    raw_type = np.dtype(desc['fmt'] + ('i2' if desc['comm_type'] else 'i1'))
+    nz = desc['wave_array_1'] // raw_type.itemsize
+    raw = np.frombuffer(fid.map, dtype=raw_type, count=nz, offset=desc['header_len'])
+    params = dict(z0=desc['horiz_interval'] + desc['horiz_offset'], dz=desc['horiz_interval'],
+                  nz=nz, scale=desc['vertical_gain'], offset=desc['vertical_offset'])
+    return raw, params
+
+
+def _saft_source(fname):
+    """
+    Returns the raw samples of a SAFT file as a (X, Y, Z) array mapped without copy, without
+    the data header of each A-scan, and their scaling. The axes are in the same order as in
+    :func:`readers.saft`.
+    """
+    mm = _get_map(fname)
+    header, t, X, Y = _cached(fname, ('saft',), lambda: _read_saft_metadata(mm))
+    nbits = 8 + 8*header['data_16bit']
+    len_data_header = 2**5//(nbits//8)
+    raw = np.frombuffer(mm, dtype='uint16' if header['data_16bit'] else 'uint8',
+                        count=len(Y)*len(X)*(len(t) + len_data_header), offset=SAFT_NHEADER)
+    raw = raw.reshape(len(Y), len(X), len(t) + len_data_header)[:, :, len_data_header:]
+    # the samples are stored with Y varying slowest, the transpose is a view
+    raw = raw.transpose(1, 0, 2)
+    params = dict(z0=float(t[0]) if len(t) else 0., dz=1/header['sampling_rate'], nz=len(t),
+                  offset=float(2**(nbits-1)), X=X, Y=Y)
+    return raw, params
+
+
+_SOURCES = {'lecroy': _lecroy_source, 'saft': _saft_source}
@@ -0,0 +1,102 @@
+"""
+Pool of memory maps of the binary files opened by the readers. Interactive tools often read the
+same files repeatedly, e.g. when scrolling through scan positions: the readers get the map of
+a file from the pool instead of opening and mapping it at each call.
+
+The pool holds up to `POOL_SIZE` maps, and closes the least recently used ones first. A map is
+reused only if the size and modification time of the file did not change. The pool can be used
+from several threads: each reader gets its own file-like view of the shared map, with its own
+position.
+"""
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+
+# maximum number of memory maps kept open
+POOL_SIZE = 16
+
+_pool = OrderedDict()
+_lock = threading.Lock()
+
+
+def clear():
+    """
+    Releases all the memory maps of the pool, e.g. to allow the files to be modified or
+    deleted on platforms which lock mapped files. Arrays still referencing a map keep it alive
+    until they are deleted.
+    """
+    with _lock:
+        _pool.clear()
+
+
+def _get_map(fname):
+    """ Returns a read-only memory map of the whole file, from the pool if possible."""
+    path = os.path.abspath(fname)
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _lock:
+        if key in _pool:
+            _pool.move_to_end(key)
+            return _pool[key]
+
+    if st.st_size == 0:
+        raise IOError('{} is empty.'.format(fname))
+    with open(path, 'rb') as fid:
+        mm = mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with _lock:
+        # drop the maps of previous versions of the file
+        for old in [k for k in _pool if k[0] == path]:
+            del _pool[old]
+        _pool[key] = mm
+        while len(_pool) > POOL_SIZE:
+            # the map is not closed explicitly, as arrays returned by the readers may still use
+            # it. It is closed when the last of them is deleted
+            _pool.popitem(last=False)
+    return mm
+
+
+def _open(fname):
+    """ Returns a file-like object reading the pooled memory map of a file."""
+    return _MapReader(_get_map(fname))
+
+
+class _MapReader(object):
+    """
+    Read-only file-like view of a memory map, with its own position, so that several threads
+    can read the same map at once.
+    """
+    __slots__ = ('map', 'pos')
+
+    def __init__(self, mm):
+        self.map = mm
+        self.pos = 0
+
+    def read(self, size=-1):
+        stop = len(self.map) if size is None or size < 0 else min(self.pos + size, len(self.map))
+        out = self.map[self.pos:stop]
+        self.pos = max(stop, self.pos)
+        return out
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += len(self.map)
+        self.pos = offset
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def close(self):
+        # the map belongs to the pool
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
@@ -0,0 +1,176 @@
+"""
+Opt-in instrumentation of the readers. Inside a :func:`profile` block, each call to a reader
+records the time spent in each phase of the read (header parsing, sample parsing, reshaping,
+coordinates and xarray construction), the number of bytes read from the file, and the size of
+the arrays it allocated::
+
+    with readers.profile() as prof:
+        readers.saft(fname)
+    print(prof.to_frame())
+
+Outside of a :func:`profile` block, the hooks called by the readers return immediately, and do
+not time or count anything. Only the reads done in the current process are recorded.
+"""
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+# the profiles currently collecting records, in the order they were entered
+_profiles = []
+
+# the record of the read in progress in each thread
+_local = threading.local()
+
+
+class Profile(object):
+    """
+    Collects the records of the reads done while it is active. Use :func:`profile` to create
+    one.
+
+    Attributes
+    ----------
+    records : list
+        One dictionary for each read, with the keys: `reader` (name of the reader), `file`,
+        `total` (seconds), `phases` (seconds spent in each phase), `bytes_read`, `array_bytes`
+        (total size of the arrays allocated for the data) and `peak_array_bytes` (size of the
+        largest of these arrays).
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.records = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        _profiles.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _profiles.remove(self)
+        return False
+
+    def _add(self, record):
+        with self._lock:
+            self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def to_frame(self):
+        """
+        Returns the records as a `pandas.DataFrame`, with one row per read, and the time spent
+        in each phase in columns named `phase_<name>`.
+        """
+        rows = []
+        for record in self.records:
+            row = OrderedDict((key, val) for key, val in record.items() if key != 'phases')
+            for name, seconds in record['phases'].items():
+                row['phase_' + name] = seconds
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+
+def profile(callback=None):
+    """
+    Starts collecting metrics of the reads, until the end of the `with` block.
+
+    Parameters
+    ----------
+    callback : callable, optional
+        Called with the record of each read (see :class:`Profile`) when the read ends, for
+        example to export the metrics. The records are also logged at the DEBUG level to the
+        `readers.profiling` logger.
+
+    Returns
+    -------
+    : Profile
+        The context manager collecting the records.
+    """
+    return Profile(callback)
+
+
+def _profiled(reader):
+    """
+    Decorator for the reader functions. When a profile is active, opens a record for the
+    duration of the call. Reads done by a reader from within another reader are counted in
+    the record of the outer reader.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _profiles or getattr(_local, 'record', None) is not None:
+                return func(*args, **kwargs)
+            fname = args[0] if args else next(iter(kwargs.values()), None)
+            record = OrderedDict([('reader', reader), ('file', str(fname)), ('total', 0.),
+                                  ('bytes_read', 0), ('array_bytes', 0),
+                                  ('peak_array_bytes', 0), ('phases', OrderedDict())])
+            _local.record = record
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record['total'] = time.perf_counter() - start
+                _local.record = None
+                logger.debug('%s', dict(record))
+                for prof in list(_profiles):
+                    prof._add(record)
+        return wrapper
+    return decorator
+
+
+class _NullPhase(object):
+    """ Phase timer used when no profile is active. """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase(object):
+    """ Adds the time spent in the `with` block to a phase of a record. """
+    def __init__(self, phases, name):
+        self.phases = phases
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.phases[self.name] = self.phases.get(self.name, 0.) + time.perf_counter() - \
+            self.start
+        return False
+
+
+def _phase(name):
+    """
+    Times a phase of the current read, used as `with _phase('header'): ...`. Phases entered
+    several times in a read (e.g. once per block) are summed.
+    """
+    record = getattr(_local, 'record', None)
+    if record is None:
+        return _NULL_PHASE
+    return _Phase(record['phases'], name)
+
+
+def _add_bytes(nbytes):
+    """ Counts `nbytes` read from the file by the current read. """
+    record = getattr(_local, 'record', None)
+    if record is not None:
+        record['bytes_read'] += int(nbytes)
+
+
+def _add_array(arr):
+    """ Counts an array allocated by the current read for the data. """
+    record = getattr(_local, 'record', None)
+    if record is not None:
+        record['array_bytes'] += arr.nbytes
+        record['peak_array_bytes'] = max(record['peak_array_bytes'], arr.nbytes)
@@ -0,0 +1,37 @@
+"""
+Progress reporting and cooperative cancellation of long reads.
+
+Readers which support it take a `progress` callable, called as `progress(done, total)` with the
+number of bytes processed so far and the total, and a `cancel` token. The token is checked
+between blocks or chunks of the read, and when it is set the read stops by raising
+:class:`ReadCancelled`. The memory allocated by the read, and the file it opened, are released
+when the exception propagates.
+"""
+import threading
+
+
+class ReadCancelled(Exception):
+    """ Raised by a reader when its cancellation token is set. """
+    pass
+
+
+class CancelToken(threading.Event):
+    """
+    Token to cancel a read from another thread, e.g. a GUI or a job scheduler. Any object with
+    an `is_set()` method, such as a :class:`threading.Event`, can also be used.
+    """
+    def cancel(self):
+        """ Requests the cancellation of the reads using this token. """
+        self.set()
+
+
+def _check(cancel):
+    """ Raises :class:`ReadCancelled` if the cancellation token is set."""
+    if cancel is not None and cancel.is_set():
+        raise ReadCancelled('The read was cancelled.')
+
+
+def _report(progress, done, total):
+    """ Calls the progress callback, if one was given."""
+    if progress is not None:
+        progress(done, total)
@@ -0,0 +1,179 @@
+"""
+Assembles raster scans saved over multiple files into a single (X, Y, Z) volume.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import xarray as xr
+
+from .catalog import _detect
+from .lecroy import _read_wavedesc
+from .saft import NHEADER as SAFT_NHEADER, _read_file_header as _read_saft_header, _recenter
+from .pool import _get_map, _open
+
+
+def raster(fnames, x=None, y=None, out=None, units=None, workers=None):
+    """
+    Assembles a raster scan from multiple files into one volume. The A-scans of each file are
+    written directly in their place in the volume.
+
+    Two cases are supported:
+
+    - LeCroy binary files (.trc), each holding the A-scan at one (X, Y) position.
+    - SAFT files, each holding part of the raster.
+
+    Parameters
+    ----------
+    fnames : list
+        The files to assemble. All files must have the same format, and the same time axis
+        (and for SAFT files, the same scan and index steps).
+
+    x, y : array_like, optional
+        The position of each file along X (scan) and Y (index). For LeCroy files, these are the
+        positions of the A-scan in each file, and are required. For SAFT files, these are the
+        positions of the first A-scan in each file, in meters. By default, they are taken from
+        the scan start fields of the SAFT headers.
+
+    out : string, optional
+        If given, the volume is stored in a memory-mapped file at this path, so that volumes
+        larger than memory can be assembled. Otherwise, the volume is allocated in memory.
+
+    units : string, optional
+        The units of `x` and `y` for LeCroy files, stored as attributes of the coordinates.
+
+    workers : int, optional
+        Number of threads reading the files. By default, the files are read sequentially.
+
+    Returns
+    -------
+    : xarray.DataArray
+        The scan volume, with coordinates X, Y and Z (time, in seconds). Positions of the
+        raster not covered by any of the files are NaN.
+    """
+    fnames = list(fnames)
+    fmt = _detect(fnames[0], os.path.getsize(fnames[0]))
+    for f in fnames[1:]:
+        if _detect(f, os.path.getsize(f)) != fmt:
+            raise ValueError('{} is not in the same format as {} ({}).'.format(f, fnames[0], fmt))
+    if fmt == 'lecroy':
+        if x is None or y is None:
+            raise ValueError('The X and Y positions of each LeCroy file are required.')
+        coords, tasks = _lecroy_layout(fnames, x, y, units)
+        read = _read_lecroy
+    elif fmt == 'saft':
+        coords, tasks = _saft_layout(fnames, x, y)
+        read = _read_saft
+    else:
+        raise ValueError('Unsupported file format for raster assembly: {}'.format(fmt))
+
+    shape = tuple(len(values) for _, values, _ in coords)
+    if out is None:
+        vol = np.full(shape, np.nan)
+    else:
+        vol = np.memmap(out, dtype='float64', mode='w+', shape=shape)
+        vol[:] = np.nan
+
+    if workers is None or workers <= 1:
+        for task in tasks:
+            read(vol, *task)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # consume the results, to raise the exceptions from the threads
+            list(executor.map(lambda task: read(vol, *task), tasks))
+
+    if isinstance(vol, np.memmap):
+        vol.flush()
+    da = xr.DataArray(vol, coords=[(name, values) for name, values, _ in coords])
+    for name, _, attrs in coords:
+        da.coords[name].attrs.update(attrs)
+    return da
+
+
+def _lecroy_layout(fnames, x, y, units):
+    """ Computes the coordinates of the volume, and the place of each LeCroy file in it. """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if len(x) != len(fnames) or len(y) != len(fnames):
+        raise ValueError('There should be one X and Y position for each file.')
+
+    with open(fnames[0], 'rb') as fid:
+        _, desc = _read_wavedesc(fid)
+    nz = desc['wave_array_1'] // (2 if desc['comm_type'] else 1)
+    Z = np.arange(1, nz + 1)*desc['horiz_interval'] + desc['horiz_offset']
+
+    X, ix = np.unique(x, return_inverse=True)
+    Y, iy = np.unique(y, return_inverse=True)
+    attrs = {} if units is None else {'units': units}
+    coords = [('X', X, attrs), ('Y', Y, attrs), ('Z', Z, {'units': 's'})]
+    return coords, [(f, i, j, desc) for f, i, j in zip(fnames, ix, iy)]
+
+
+def _read_lecroy(vol, fname, ix, iy, ref):
+    """
+    Reads the A-scan of a LeCroy file into the volume, after checking that its time axis is
+    the same as the one of the first file, described by `ref`.
+    """
+    # the files are mapped through the pool, so repeated assemblies do not map them again
+    with _open(fname) as fid:
+        _, desc = _read_wavedesc(fid)
+        raw_type = np.dtype(desc['fmt'] + ('i2' if desc['comm_type'] else 'i1'))
+        nz = desc['wave_array_1'] // raw_type.itemsize
+        if nz != vol.shape[2]:
+            raise ValueError('{} has {} samples, expected {}.'.format(fname, nz, vol.shape[2]))
+        # the trigger offset jitters between acquisitions, but by less than half a sample
+        if not np.isclose(desc['horiz_interval'], ref['horiz_interval'], rtol=1e-6, atol=0) or \
+                abs(desc['horiz_offset'] - ref['horiz_offset']) > 0.5*ref['horiz_interval']:
+            raise ValueError('{} does not have the same time axis as the first file.'.format(
+                fname))
+        raw = np.frombuffer(fid.map, dtype=raw_type, count=nz, offset=desc['header_len'])
+    dst = vol[ix, iy, :]
+    np.multiply(raw, desc['vertical_gain'], out=dst)
+    dst -= desc['vertical_offset']
+
+
+# header fields which should be the same in all the SAFT files of a raster
+_SAFT_GRID = ('samp_ascan_length', 'data_16bit', 'samp_windowstart_ns', 'samp_windowstop_ns',
+              'scan_xstep_in', 'scan_ystep_in')
+
+
+def _saft_layout(fnames, x, y):
+    """ Computes the coordinates of the volume, and the place of each SAFT file in it. """
+    headers = [_read_saft_header(f) for f in fnames]
+    h = headers[0]
+    # the hardcoded constant 25.4e-3 is to convert from inches to meters, as in readers.saft
+    dx, dy = h['scan_xstep_in']*25.4e-3, h['scan_ystep_in']*25.4e-3
+    if x is None:
+        x = [hi['scan_xstart_in']*25.4e-3 for hi in headers]
+    if y is None:
+        y = [hi['scan_ystart_in']*25.4e-3 for hi in headers]
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+
+    for f, hi in zip(fnames, headers):
+        if any(hi[key] != h[key] for key in _SAFT_GRID):
+            raise ValueError('{} does not have the same A-scans or steps as {}.'.format(
+                f, fnames[0]))
+
+    # index of the first A-scan of each file in the volume
+    ix = np.round((x - x.min())/dx).astype(int) if dx else np.zeros(len(x), dtype=int)
+    iy = np.round((y - y.min())/dy).astype(int) if dy else np.zeros(len(y), dtype=int)
+    nx = max(i + hi['scan_xpoints'] for i, hi in zip(ix, headers))
+    ny = max(i + hi['scan_ypoints'] for i, hi in zip(iy, headers))
+
+    ns = h['samp_ascan_length']
+    fs = ns*1e9/(h['samp_windowstop_ns'] - h['samp_windowstart_ns'])
+    coords = [('X', x.min() + np.arange(nx)*dx, {'units': 'm'}),
+              ('Y', y.min() + np.arange(ny)*dy, {'units': 'm'}),
+              ('Z', h['samp_windowstart_ns']*1e-9 + np.arange(ns)/fs, {'units': 's'})]
+    return coords, list(zip(fnames, headers, ix, iy))
+
+
+def _read_saft(vol, fname, header, ix, iy):
+    raw_type = np.dtype('<u2' if header['data_16bit'] else 'u1')
+    nx, ny, ns = header['scan_xpoints'], header['scan_ypoints'], header['samp_ascan_length']
+    len_data_header = 2**5 // raw_type.itemsize
+    raw = np.frombuffer(_get_map(fname), dtype=raw_type, count=ny*nx*(ns + len_data_header),
+                        offset=SAFT_NHEADER).reshape(ny, nx, ns + len_data_header)
+    # one index line at a time, to bound the temporary memory
+    for j in range(ny):
+        line = _recenter(np.array(raw[j, :, len_data_header:]))
+        vol[ix:ix + nx, iy + j, :] = line
+    del raw
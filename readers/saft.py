@@ -1,8 +1,23 @@
 import numpy as np
-import pandas as pd
+import xarray as xr
+from ._utils import _roi_indices
+from .profiling import _profiled, _phase, _add_bytes, _add_array
+from .progress import _check, _report
+from .headers import SaftHeader
+from .pool import _get_map
+from .cache import _cached
 
 
-def saft(fname):
+# Number of bytes in the file header
+NHEADER = 2**11
+
+# maximum number of samples converted at once
+CHUNK_SIZE = 2**22
+
+
+@_profiled('saft')
+def saft(fname, native=False, x=None, y=None, z=None, progress=None, cancel=None,
+         condition=None):
     """
     Reads a binary file stored in SAFT format. SAFT is a custom scanner at PNNL.
 
@@ -11,35 +26,125 @@ def saft(fname):
     fname : string
         Name of the file to open (with absolute or relative path).
 
+    native : bool, optional
+        If True, the samples are kept as signed integers (`int8` for 8-bit data, `int16` for
+        16-bit data) instead of being converted to `float`. The values are the same as the
+        default float output, at 1/8 (8-bit) or 1/4 (16-bit) of the memory. The offset which was
+        removed from the raw unsigned samples is stored in the `data_offset` header field and
+        attribute.
+
+    x, y, z : slice, optional
+        Region of interest along the scan (X, meters), index (Y, meters) and time (Z, seconds)
+        axes, given as `slice(start, stop)` in the units of the coordinates, with both bounds
+        included. Only the samples inside the region are read from the file.
+
+    progress : callable, optional
+        Called as `progress(done, total)` after each chunk of index lines is read, with the
+        number of bytes of samples read so far and the total to read.
+
+    cancel : readers.CancelToken, optional
+        Checked before each chunk of index lines is read. When it is set, the read stops and
+        raises :class:`readers.ReadCancelled`.
+
+    condition : readers.Conditioning, optional
+        Band-pass filter and envelope detection applied to the A-scans as they are read. The
+        samples are returned with the type of the conditioning. Cannot be used with `native`.
+
     Returns
     -------
-    : utkit.Signal3D, header
-        A 2-element tuple where the first element is the Signal3D stored in the SAFT file,
-        returned as a :class:`utkit.Signal3D` object. The second element is a dictionary
-        representing the SAFT file header fields.
+    : xarray.DataArray, header
+        A 2-element tuple. The first element is the scan, with coordinates X, Y (meters) and Z
+        (seconds), each with a `units` attribute. Its `data_offset` attribute is the offset
+        removed from the raw unsigned samples, and its `scale` attribute the factor converting
+        the samples to the values of the default float output (`data*scale`), so that
+        native samples can be converted only where needed. The second element is a
+        dictionary representing the SAFT file header fields.
+    """
+    if native and condition is not None:
+        raise ValueError('Conditioned samples cannot be returned in the native type.')
+
+    # the file is memory mapped once, and the map is shared by repeated reads of the file
+    mm = _get_map(fname)
+    with _phase('header'):
+        # the header and axes are decoded once, and then taken from the cache while the file
+        # is unchanged
+        header, t, X, Y = _cached(fname, ('saft',), lambda: _read_metadata(mm))
+        data_type = 'uint16' if header['data_16bit'] else 'uint8'
+        nbits = 8 + 8*header['data_16bit']
+        Nx, Ny, Ns = len(X), len(Y), len(t)
+        len_data_header = 2**5//(nbits//8)
+
+    header['data_offset'] = 2**(nbits-1)
+    with _phase('parse'):
+        # only the pages of the file holding the region of interest are read from the memory
+        # map. The data header before each A-scan is skipped by the Z slice
+        xs, ys, zs = _roi_indices(X, x), _roi_indices(Y, y), _roi_indices(t, z)
+        raw = np.frombuffer(mm, dtype=data_type, count=Ny*Nx*(Ns+len_data_header),
+                            offset=NHEADER).reshape(Ny, Nx, Ns+len_data_header)
+        try:
+            raw = raw[ys, xs, len_data_header+zs.start:len_data_header+zs.stop]
+            if condition is not None:
+                out_type = condition.dtype
+            else:
+                out_type = data_type.replace('u', '') if native else 'float'
+            data = np.empty(raw.shape, dtype=out_type)
+            _add_array(data)
+            # the samples are converted a few index lines at a time, to report progress, check
+            # for cancellation, and bound the temporary memory
+            line_size = int(np.prod(raw.shape[1:]))
+            step = max(1, CHUNK_SIZE // max(line_size, 1))
+            for iy in range(0, raw.shape[0], step):
+                _check(cancel)
+                # copy into a writable buffer, so that the samples can be recentered in place
+                chunk = np.array(raw[iy:iy+step])
+                if native:
+                    data[iy:iy+step] = _recenter(chunk)
+                elif condition is not None:
+                    # the chunk is filtered while it is in cache, straight into the output
+                    condition.apply(np.subtract(chunk, header['data_offset'], dtype='float'),
+                                    1/header['sampling_rate'], out=data[iy:iy+step])
+                else:
+                    np.subtract(chunk, header['data_offset'], out=data[iy:iy+step],
+                                dtype='float')
+                _add_bytes(chunk.nbytes)
+                _report(progress, min(iy+step, raw.shape[0])*line_size*raw.itemsize, raw.nbytes)
+        finally:
+            del raw
+
+    with _phase('reshape'):
+        # the samples are stored with Y varying slowest, the transpose is a view
+        data = np.transpose(data, (1, 0, 2))
+
+    with _phase('output'):
+        da = xr.DataArray(data, coords=[('X', X[xs]), ('Y', Y[ys]), ('Z', t[zs])],
+                          attrs={'data_offset': header['data_offset'], 'scale': 1.})
+    da.coords['X'].attrs['units'] = 'm'
+    da.coords['Y'].attrs['units'] = 'm'
+    da.coords['Z'].attrs['units'] = 's'
+    return da, header
+
+
+def _read_metadata(mm):
+    """
+    Decodes the header of a memory mapped SAFT file, checks the size of the file, and computes
+    the time, X and Y axes.
     """
-    # Number of bytes in the file header
-    NHEADER = 2**11
-    fid = open(fname, 'rb')
-    htext = fid.read(NHEADER)
-    header = _read_header(htext)
-    data_type = 'uint16' if header['data_16bit'] else 'uint8'
+    if len(mm) < NHEADER:
+        raise IOError("File is shorter than the SAFT header.")
+    header = _read_header(mm[:NHEADER])
+    _add_bytes(NHEADER)
     nbits = 8 + 8*header['data_16bit']
-    data = np.frombuffer(fid.read(), dtype=data_type)
-    fid.close()
 
     Nx = header['scan_xpoints']
     Ny = header['scan_ypoints']
     Ns = header['samp_ascan_length']
-    len_data_header = 2**5/(nbits/8)
+    len_data_header = 2**5//(nbits//8)
 
     # verify that the file is intact, and reading is correct
-    computed_nascans = len(data)/(Ns+len_data_header)
+    computed_nascans = (len(mm) - NHEADER)/((Ns+len_data_header)*nbits//8)
     if computed_nascans != Nx*Ny:
         raise IOError("The number of A-scans is incorrect. Possibly corrupt reading.")
-    # remove the data header before each A-scan
-    data = data.reshape(Ny, Nx, Ns+len_data_header)[:, :, len_data_header:]
-    data = np.transpose(data.astype('float') - 2**(nbits-1), (0, 2, 1))
+
     header['sampling_rate'] = Ns*1e9/(header['samp_windowstop_ns'] - header['samp_windowstart_ns'])
     # the constant 1e-9 is to convert from nanosecond to second
     t = header['samp_windowstart_ns']*1e-9 + np.arange(Ns)/header['sampling_rate']
@@ -47,7 +152,28 @@ def saft(fname):
     # the hardcoded constant 25.4e-3 is to convert from inches to meters
     X = np.arange(header['scan_xpoints'])*header['scan_xstep_in']*25.4e-3
     Y = np.arange(header['scan_ypoints'])*header['scan_ystep_in']*25.4e-3
-    return pd.Panel(data, items=Y, major_axis=t, minor_axis=X), header
+    return header, t, X, Y
+
+
+def _recenter(raw):
+    """
+    Converts unsigned raw samples to signed samples centered on zero, i.e. subtracts
+    2**(nbits-1), in place. Flipping the most significant bit of an unsigned integer and
+    reinterpreting it as signed is the same as this subtraction, and needs no extra memory.
+    Returns a signed integer view of `raw`.
+    """
+    nbits = 8*raw.dtype.itemsize
+    np.bitwise_xor(raw, raw.dtype.type(1 << (nbits-1)), out=raw)
+    return raw.view(raw.dtype.str.replace('u', 'i'))
+
+
+def _read_file_header(fname):
+    """ Reads only the header of a SAFT file, without loading the A-scans."""
+    with open(fname, 'rb') as fid:
+        htext = fid.read(NHEADER)
+    if len(htext) < NHEADER:
+        raise IOError("File is shorter than the SAFT header.")
+    return _read_header(htext)
 
 
 def _header_field(htext, start_ind, field_len, dtype=None):
@@ -75,7 +201,7 @@ def _read_header(htext):
     """
     Reads a SAFT header into corresponding fields
     """
-    header = {}
+    header = SaftHeader()
     n = 0
     # ----------------------- General Fields ------------------------------#
     n, header['ascii'] = _header_field(htext, n, 10, dtype=str)
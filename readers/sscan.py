@@ -0,0 +1,167 @@
+"""
+Builds sectorial scans (S-scans) from phased array data read from UltraVision files.
+
+The conversion from the (time, angle) polar grid of the focal laws to a Cartesian (depth,
+lateral) grid is a fixed linear map for a given set of focal laws and output grid: each output
+pixel is a bilinear interpolation of 4 samples. The weights of this map are computed once,
+cached, and applied to all scan positions at once.
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+import xarray as xr
+
+
+# maximum number of interpolation weights kept in the cache
+CACHE_SIZE = 8
+
+# maximum number of output values computed at once
+CHUNK_SIZE = 2**22
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def sscan(data, speed, lateral=None, depth=None):
+    """
+    Computes the S-scan images at all the scan positions of phased array data.
+
+    Parameters
+    ----------
+    data : xarray.DataArray
+        Phased array data with dimensions (X, Y, Z, angle), as returned by
+        :func:`readers._ultravision.ultravision` when (angles, fs, speed) are given. The `Z`
+        axis is time in seconds. If the data has a `Z_law` coordinate, it is used as the time
+        axis of each focal law. The angles are the refracted angles in degrees.
+
+    speed : float
+        The wave speed in the test specimen (m/s), used to convert time to sound path.
+
+    lateral : array_like, optional
+        The lateral positions (m) of the S-scan pixels, relative to the beam exit point. By
+        default, the lateral extent of the sector is covered with a step of one sample of sound
+        path.
+
+    depth : array_like, optional
+        The depths (m) of the S-scan pixels. By default, the depth extent of the sector is
+        covered with a step of one sample of sound path.
+
+    Returns
+    -------
+    : xarray.DataArray
+        The S-scans, with dimensions (X, Y, depth, lateral). Pixels outside of the sector
+        covered by the focal laws are NaN.
+    """
+    if data.dims != ('X', 'Y', 'Z', 'angle'):
+        raise ValueError('Expected data with dimensions (X, Y, Z, angle).')
+    if data.coords['Z'].attrs.get('units', 's') != 's':
+        raise ValueError('The Z axis should be time, in seconds.')
+
+    angles = np.asarray(data.coords['angle'].values, dtype=float)
+    if len(angles) < 2:
+        raise ValueError('At least two focal laws are needed to build an S-scan.')
+    nz = data.sizes['Z']
+    if 'Z_law' in data.coords:
+        z = data.coords['Z_law'].transpose('angle', 'Z').values
+    else:
+        z = np.tile(data.coords['Z'].values, (len(angles), 1))
+    z_start, z_step = z[:, 0], z[:, 1] - z[:, 0]
+
+    # sound path (m) extent of the data, used for the default grid
+    step = speed * z_step.min() / 2
+    rmin, rmax = speed * z_start.min() / 2, speed * (z_start + (nz - 1) * z_step).max() / 2
+    theta = np.deg2rad(angles)
+    if lateral is None:
+        lims = rmax * np.sin([theta.min(), theta.max()])
+        lims = [min(lims[0], 0), max(lims[1], 0)]
+        lateral = np.arange(lims[0], lims[1] + step / 2, step)
+    if depth is None:
+        lims = [rmin * np.cos(np.abs(theta)).min(), rmax * np.cos(np.abs(theta)).max()]
+        depth = np.arange(lims[0], lims[1] + step / 2, step)
+    lateral = np.asarray(lateral, dtype=float)
+    depth = np.asarray(depth, dtype=float)
+
+    pixels, ind, weights = _weights(angles, z_start, z_step, nz, lateral, depth, speed)
+    values = data.values.reshape(data.sizes['X'] * data.sizes['Y'], -1)
+    out = np.full((values.shape[0], len(depth) * len(lateral)), np.nan)
+    _apply(values, pixels, ind, weights, out)
+    out = out.reshape(data.sizes['X'], data.sizes['Y'], len(depth), len(lateral))
+
+    da = xr.DataArray(out, coords=[('X', data.coords['X'].values),
+                                   ('Y', data.coords['Y'].values),
+                                   ('depth', depth),
+                                   ('lateral', lateral)])
+    da.coords['X'].attrs = dict(data.coords['X'].attrs)
+    da.coords['Y'].attrs = dict(data.coords['Y'].attrs)
+    da.coords['depth'].attrs['units'] = 'm'
+    da.coords['lateral'].attrs['units'] = 'm'
+    return da
+
+
+def _weights(angles, z_start, z_step, nz, lateral, depth, speed):
+    """
+    Computes (or gets from the cache) the bilinear interpolation weights of the S-scan pixels.
+
+    Returns
+    -------
+    : tuple
+        The flat indices of the pixels inside the sector covered by the focal laws, and two
+        (npixels, 4) arrays for these pixels: the indices of the samples in the flattened
+        (Z, angle) data of one scan position, and their weights.
+    """
+    key = (angles.tobytes(), z_start.tobytes(), z_step.tobytes(), nz,
+           lateral.tobytes(), depth.tobytes(), float(speed))
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    nlaws = len(angles)
+    lat, dep = np.meshgrid(lateral, depth)
+    # time of flight and angle of each pixel
+    t = 2 * np.hypot(lat, dep).ravel() / speed
+    theta = np.rad2deg(np.arctan2(lat, dep)).ravel()
+
+    order = np.argsort(angles)
+    sorted_angles = angles[order]
+    valid = (theta >= sorted_angles[0]) & (theta <= sorted_angles[-1])
+    pos = np.interp(theta, sorted_angles, np.arange(nlaws))
+    ia = np.clip(np.floor(pos).astype(int), 0, nlaws - 2)
+    wa = pos - ia
+
+    ind, weights = [], []
+    for shift, wlaw in [(0, 1 - wa), (1, wa)]:
+        law = order[ia + shift]
+        pos = (t - z_start[law]) / z_step[law]
+        valid &= (pos >= 0) & (pos <= nz - 1)
+        it = np.clip(np.floor(pos).astype(int), 0, max(nz - 2, 0))
+        wt = pos - it
+        # index in the flattened (Z, angle) data
+        ind += [it * nlaws + law, np.minimum(it + 1, nz - 1) * nlaws + law]
+        weights += [wlaw * (1 - wt), wlaw * wt]
+
+    # only keep the pixels inside the sector
+    pixels = np.flatnonzero(valid)
+    out = pixels, np.stack(ind, axis=1)[pixels], np.stack(weights, axis=1)[pixels]
+
+    # the weights are computed outside of the lock, two threads may compute the same weights
+    with _lock:
+        _cache[key] = out
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return out
+
+
+def _apply(values, pixels, ind, weights, out):
+    """
+    Applies the interpolation weights to each row of `values` (scan position, Z * angle), and
+    writes the result in the `pixels` columns of `out`. The rows are processed in chunks, to
+    bound the temporary memory.
+    """
+    step = max(1, CHUNK_SIZE // max(ind.shape[0], 1))
+    for start in range(0, values.shape[0], step):
+        v = values[start:start + step]
+        acc = v[:, ind[:, 0]] * weights[:, 0]
+        for k in range(1, ind.shape[1]):
+            acc += v[:, ind[:, k]] * weights[:, k]
+        out[start:start + step, pixels] = acc
@@ -1,46 +1,290 @@
+import os
+from itertools import islice
 import numpy as np
-import pandas as pd
-from pandas.io.common import EmptyDataError
 import xarray as xr
-import gc
+from ._utils import _roi_indices
+from .profiling import _profiled, _phase, _add_bytes, _add_array
+from .progress import _check, _report
+from .cache import _copy, _lookup, _store
+from .pool import _get_map
 
 
 # number of lines for the data header in ultravision text file export
 NHEADER = 19
 
+# maximum number of values parsed at once when reading a data block
+CHUNK_SIZE = 2**20
+
+# first bytes of the binary export, followed by the type of the samples (e.g. `<f4`)
+BINARY_MAGIC = b'UVBINARY'
+
 
 def _process_header(header, fs):
     out = dict(channel=None, x=None, y=None, z=None, units=None)
-
-    parts = header.index.str.split()
-    # remove unit values from the header labels
-    header.index = [' '.join([pi for pi in p if not any((c in pi) for c in set('[]()'))])
-                    for p in parts]
+    values, units, _ = _split_header(header)
 
     # construct the coordinates of the axes of the scan
-    nx, ny, nz = int(header['ScanQty']), int(header['IndexQty']), int(header['USoundQty'])
-    out['x'] = float(header['ScanStart']) + np.arange(nx) * float(header['ScanResol'])
-    out['y'] = float(header['IndexStart']) + np.arange(ny) * float(header['IndexResol'])
+    nx, ny, nz = int(values['ScanQty']), int(values['IndexQty']), int(values['USoundQty'])
+    out['x'] = float(values['ScanStart']) + np.arange(nx) * float(values['ScanResol'])
+    out['y'] = float(values['IndexStart']) + np.arange(ny) * float(values['IndexResol'])
 
     # get the units of the scan
-    units = [p[-1][1:-1] if p[-1][0] == '(' and p[-1][-1] == ')' else None for p in parts]
-    units = pd.Series(units, index=header.index)
-    out['units'] = {'x': units['IndexResol'], 'y': units['ScanResol'], 'z': 'seconds'}
+    out['units'] = {'x': units['ScanResol'], 'y': units['IndexResol'], 'z': 'seconds'}
 
     if fs is None:
-        ts = float(header['USoundResol'])
-        tstart = float(header['USoundStart'])
+        ts = float(values['USoundResol'])
+        tstart = float(values['USoundStart'])
         out['z'] = tstart + np.arange(nz)*ts
     else:
         out['z'] = np.arange(nz)/fs
 
-    out['channel'] = header['Channel']
+    out['channel'] = values['Channel']
+    return out
+
+
+def _read_header(fid):
+    """
+    Reads the `NHEADER` lines of a block header at the current position of a file opened in
+    binary mode. Returns a `dict` with the raw header labels as keys, or None if the end of the
+    file is reached.
+    """
+    header = {}
+    for i in range(NHEADER):
+        line = fid.readline()
+        if not line.strip():
+            if i == 0:
+                return None
+            raise IOError('Incomplete block header. Possibly corrupt file.')
+        label, _, value = line.decode('latin-1').partition('=')
+        header[label.strip()] = value.strip()
+    return header
+
+
+def _split_header(header):
+    """
+    Splits the raw labels of a block header, e.g. `USoundStart [True Depth] (mm)`, into the
+    field name, units and qualifier.
+
+    Returns
+    -------
+    : tuple
+        Three dictionaries indexed by the field names (e.g. `USoundStart`): the field values,
+        the units (None if not given), and the qualifiers in square brackets (None if not
+        given).
+    """
+    values, units, qualifiers = {}, {}, {}
+    for label, value in header.items():
+        parts = label.split()
+        # remove unit values from the header labels
+        name = ' '.join(p for p in parts if not any((c in p) for c in '[]()'))
+        values[name] = value
+        units[name] = parts[-1][1:-1] if parts[-1][0] == '(' and parts[-1][-1] == ')' else None
+        start, stop = label.find('['), label.find(']')
+        qualifiers[name] = label[start + 1:stop] if 0 <= start < stop else None
+    return values, units, qualifiers
+
+
+def _skip_lines(fid, n, chunk_size=2**20):
+    """
+    Moves the position of a binary file object forward by `n` lines, without parsing them. The
+    file is scanned in chunks for line terminators, which is much faster than reading it line
+    by line.
+    """
+    while n > 0:
+        pos = fid.tell()
+        chunk = fid.read(chunk_size)
+        if not chunk:
+            raise IOError('Unexpected end of file. Possibly corrupt file.')
+        count = chunk.count(b'\n')
+        if count < n:
+            n -= count
+            continue
+        # find the end of the n-th line inside this chunk
+        ind = -1
+        for _ in range(n):
+            ind = chunk.index(b'\n', ind + 1)
+        fid.seek(pos + ind + 1)
+        n = 0
+
+
+def _read_rows(fid, nrows, ncols):
+    """
+    Parses `nrows` lines of tab separated values from the current position of a file opened in
+    binary mode, into a (nrows, ncols) array. The trailing tab at the end of each line is
+    ignored.
+    """
+    return _parse_rows(b''.join(islice(fid, nrows)), nrows, ncols)
+
+
+def _parse_rows(buf, nrows, ncols):
+    """
+    Parses a buffer holding `nrows` lines of tab separated values. `np.fromstring` cannot parse
+    into an existing array, so each chunk gets a new array of at most `CHUNK_SIZE` values, which
+    is released as soon as it is copied into the output of :func:`_read_block`.
+    """
+    rows = np.fromstring(buf, sep='\t')
+    if rows.size != nrows * ncols:
+        raise IOError('Expected {} values in data block, found {}. Possibly corrupt '
+                      'file.'.format(nrows * ncols, rows.size))
+    return rows.reshape(nrows, ncols)
+
+
+def _read_block(fid, nx, ny, nz, out=None, x=None, y=None, z=None, cancel=None, condition=None,
+                dz=None):
+    """
+    Parses the data rows of a block from the current position of a file opened in binary
+    mode, directly into an (nx, ny, nz) array. If `out` is not given, a new array is allocated.
+
+    The rows are parsed a few index lines at a time (up to `CHUNK_SIZE` values), so the
+    temporary memory used while parsing does not grow with the size of the block, and `out`
+    can be a view into a larger preallocated array.
+
+    `x`, `y` and `z` are optional slices of indices, to read only a region of interest of the
+    block. The rows before and after the Y slice are skipped without being parsed, as are the
+    rows outside the X slice. The file is left at the end of the block in all cases.
+
+    `cancel` is an optional cancellation token (see :mod:`readers.progress`), checked before
+    each chunk of rows is parsed.
+
+    `condition` is an optional :class:`readers.Conditioning`, applied to each chunk of rows
+    after it is parsed, with the sampling interval `dz`.
+    """
+    x0, x1, _ = (x or slice(None)).indices(nx)
+    y0, y1, _ = (y or slice(None)).indices(ny)
+    zs = z or slice(None)
+    if out is None:
+        out = np.empty((x1 - x0, y1 - y0, len(range(*zs.indices(nz)))),
+                       dtype=float if condition is None else condition.dtype)
+
+    _skip_lines(fid, nx * y0)
+    step = max(1, CHUNK_SIZE // (nx * nz))
+    for iy in range(y0, y1, step):
+        _check(cancel)
+        n = min(step, y1 - iy)
+        # rows are ordered with X varying fastest
+        if (x0, x1) == (0, nx):
+            rows = _read_rows(fid, nx * n, nz)
+        else:
+            lines = list(islice(fid, nx * n))
+            buf = b''.join(line for j in range(n) for line in lines[j*nx + x0:j*nx + x1])
+            rows = _parse_rows(buf, (x1 - x0) * n, nz)
+        rows = rows.reshape(n, x1 - x0, nz)[:, :, zs].transpose(1, 0, 2)
+        if condition is None:
+            out[:, iy - y0:iy - y0 + n, :] = rows
+        else:
+            condition.apply(rows, dz, out=out[:, iy - y0:iy - y0 + n, :])
+    _skip_lines(fid, nx * (ny - y1))
+    return out
+
+
+def _read_magic(fid):
+    """
+    Checks if a file opened in binary mode is a binary export, and moves to its first block.
+
+    Returns
+    -------
+    : numpy.dtype
+        The type of the samples of a binary export, or None for a text export.
+    """
+    fid.seek(0)
+    line = fid.readline()
+    if line.startswith(BINARY_MAGIC):
+        try:
+            return np.dtype(line.split()[1].decode())
+        except (IndexError, TypeError, UnicodeDecodeError):
+            raise IOError('Malformed binary UltraVision header')
+    fid.seek(0)
+    return None
+
+
+def _map_block(fname, offset, dtype, nx, ny, nz):
+    """
+    Maps the samples of a block of a binary export, starting at byte `offset`, as a read-only
+    (nx, ny, nz) view of the file. Nothing is copied or read until the samples are used. The
+    view is built on the map of the file from :mod:`readers.pool`, so the file is not opened
+    and mapped again for each block and each read.
+    """
+    # A-scans are ordered with X varying fastest, as the rows of the text export
+    raw = np.frombuffer(_get_map(fname), dtype=dtype, count=nx*ny*nz, offset=offset)
+    return raw.reshape(ny, nx, nz).transpose(1, 0, 2)
+
+
+def _condition_block(u, condition, dz, cancel=None):
+    """
+    Conditions a memory mapped block, a few scan lines at a time, so that the samples are
+    read from the file and filtered in the same pass.
+    """
+    out = np.empty(u.shape, dtype=condition.dtype)
+    step = max(1, CHUNK_SIZE // max(int(np.prod(u.shape[1:])), 1))
+    for ix in range(0, u.shape[0], step):
+        _check(cancel)
+        condition.apply(u[ix:ix+step], dz, out=out[ix:ix+step])
     return out
 
 
-def ultravision(fname, fs=None):
+def _iter_blocks(fid, fname, fs):
+    """
+    Iterates over the blocks of an open UltraVision file, from the current position. Yields
+    the block headers processed by :func:`_process_header`, with the file positioned at the
+    start of the block data. The data must be read or skipped before moving to the next block.
+
+    The offsets and processed headers of the blocks are cached once all the blocks were
+    iterated over, so that the next reads of the file seek to the data of each block directly.
+    """
+    kind = ('ultravision', None if fs is None else float(fs))
+    index = _lookup(fname, kind)
+    if index is not None:
+        for offset, header in index:
+            fid.seek(offset)
+            yield _copy(header)
+        return
+
+    index = []
+    while True:
+        with _phase('header'):
+            header = _read_header(fid)
+        if header is None:
+            # we reached end of file
+            break
+        with _phase('coords'):
+            header = _process_header(header, fs)
+        index.append((fid.tell(), header))
+        yield _copy(header)
+    _store(fname, kind, index)
+
+
+def _iter_headers(fname):
     """
-    Reads ultrasound scans saved in UltraVision (ZETEC, Inc. software) text file format.
+    Iterates over the block headers of an UltraVision text file, skipping over the data rows.
+
+    Yields
+    ------
+    : tuple
+        A 2-element tuple with the byte offset of the block in the file, and the block header
+        as returned by :func:`_read_header`.
+    """
+    with open(fname, 'rb') as fid:
+        dtype = _read_magic(fid)
+        while True:
+            offset = fid.tell()
+            header = _read_header(fid)
+            if header is None:
+                break
+            values = _split_header(header)[0]
+            nrows = int(values['ScanQty']) * int(values['IndexQty'])
+            yield offset, header
+            if dtype is None:
+                _skip_lines(fid, nrows)
+            else:
+                fid.seek(nrows * int(values['USoundQty']) * dtype.itemsize, 1)
+
+
+@_profiled('ultravision')
+def ultravision(fname, fs=None, x=None, y=None, z=None, progress=None, cancel=None,
+                condition=None):
+    """
+    Reads ultrasound scans saved in UltraVision (ZETEC, Inc. software) text file format, or in
+    the binary format described below.
 
     Parameters
     ----------
@@ -52,43 +296,78 @@ def ultravision(fname, fs=None):
         acquisition start time, it must be handled externally. We do not use the file header data
         for the time axis because it is inconsistent and imprecise.
 
+    x, y, z : slice, optional
+        Region of interest along the scan (X), index (Y) and time (Z, seconds) axes, given as
+        `slice(start, stop)` in the units of the coordinates, with both bounds included. Only
+        the rows of the file inside the region are parsed. The text rows hold full A-scans, so
+        a Z window reduces the memory used, but not the parsing time.
+
+    progress : callable, optional
+        Called as `progress(done, total)` after each block (channel) is parsed, with the number
+        of bytes of the file processed so far and the size of the file.
+
+    cancel : readers.CancelToken, optional
+        Checked between blocks, and between chunks of rows within a block. When it is set, the
+        read stops and raises :class:`readers.ReadCancelled`.
+
+    condition : readers.Conditioning, optional
+        Band-pass filter and envelope detection applied to the A-scans as they are parsed,
+        along the Z axis. The frequencies of the conditioning are in the inverse of the units
+        of Z. The samples are returned with the type of the conditioning, and for binary files
+        are read into memory instead of being memory mapped.
+
     Returns
     -------
     : dict
         A dictionary is returned with each channel in the file as one data entry in the `dict`.
+
+    Notes
+    -----
+    Parsing the text export costs several times the time needed to read the file. The binary
+    format holds the same blocks with raw samples instead of text rows:
+
+    - A first line `UVBINARY <dtype>`, where `<dtype>` is the numpy type string of the
+      samples, e.g. `<f4` for little-endian float32.
+    - For each block, the same header lines as the text export, followed by the nx * ny
+      A-scans of nz samples, in the order of the rows of the text export (X varying fastest).
+
+    The data of binary files is memory mapped without copy, and is only read from the file
+    when it is used. The arrays are read-only views of the file: use `.copy()` to modify
+    them.
     """
-    skiprows = 0
+    if fs is not None:
+        # a scalar is required, also as part of the key of the cached block index
+        try:
+            fs = float(fs)
+        except TypeError:
+            raise ValueError('fs should be a number, the sampling frequency.')
     out = {}
-    try:
-        while True:
-            header = pd.read_table(fname,
-                                   skiprows=skiprows,
-                                   nrows=NHEADER,
-                                   sep='=',
-                                   skipinitialspace=True,
-                                   header=None,
-                                   engine='c',
-                                   dtype=str,
-                                   index_col=0,
-                                   squeeze=True, memory_map=True)
-            header = header.str.strip()
-            header = _process_header(header, fs)
-            skiprows += NHEADER
-            nx, ny, nz = len(header['x']), len(header['y']), len(header['z'])
-            u = pd.read_table(fname,
-                              skiprows=skiprows,
-                              nrows=nx * ny,
-                              sep='\t',
-                              skipinitialspace=True,
-                              header=None,
-                              engine='c',
-                              index_col=False, memory_map=True)
-            # the last column is giving NaN values, just remove it.
-            u = u.iloc[:, :-1].values.reshape(nx, ny, -1, order='F')
-
-            da = xr.DataArray(u, coords=[('X', header['x']),
-                                         ('Y', header['y']),
-                                         ('Z', header['z'])])
+    total = os.path.getsize(fname)
+    with open(fname, 'rb') as fid:
+        dtype = _read_magic(fid)
+        for header in _iter_blocks(fid, fname, fs):
+            _check(cancel)
+            with _phase('coords'):
+                nx, ny, nz = len(header['x']), len(header['y']), len(header['z'])
+                xs, ys, zs = (_roi_indices(header['x'], x), _roi_indices(header['y'], y),
+                              _roi_indices(header['z'], z))
+                dz = header['z'][1] - header['z'][0] if nz > 1 else 1.
+            with _phase('parse'):
+                if dtype is None:
+                    u = _read_block(fid, nx, ny, nz, x=xs, y=ys, z=zs, cancel=cancel,
+                                    condition=condition, dz=dz)
+                    _add_array(u)
+                else:
+                    u = _map_block(fname, fid.tell(), dtype, nx, ny, nz)[xs, ys, zs]
+                    if condition is not None:
+                        u = _condition_block(u, condition, dz, cancel)
+                        _add_array(u)
+                    fid.seek(nx * ny * nz * dtype.itemsize, 1)
+
+            with _phase('output'):
+                da = xr.DataArray(u, coords=[('X', header['x'][xs]),
+                                             ('Y', header['y'][ys]),
+                                             ('Z', header['z'][zs])])
 
             n = 1
             key = header['channel']
@@ -97,11 +376,52 @@ def ultravision(fname, fs=None):
                 n += 1
 
             out[key] = da
-            skiprows += nx * ny
-            # memory management
-            del u
-            gc.collect()
-    except EmptyDataError:
-        # we reached end of file
-        pass
+            _report(progress, fid.tell(), total)
+        _add_bytes(fid.tell())
     return out
+
+
+def write_ultravision_binary(fname, out, dtype='<f4'):
+    """
+    Converts an UltraVision text export into the binary format read by :func:`ultravision`.
+
+    Parameters
+    ----------
+    fname : string
+        The text export.
+
+    out : string
+        The binary file to write.
+
+    dtype : numpy.dtype or string, optional
+        The type the samples are stored as, e.g. `'<f4'` or `'<f8'`.
+
+    Notes
+    -----
+    The binary file starts with the line `UVBINARY <dtype>`, followed for each block by the
+    header lines of the text export, copied unchanged, and the `nx * ny` A-scans of samples,
+    in the order of the text rows. The rows are parsed and written up to `CHUNK_SIZE` values
+    at a time, so files larger than memory can be converted.
+    """
+    dtype = np.dtype(dtype)
+    with open(fname, 'rb') as src, open(out, 'wb') as dst:
+        if _read_magic(src) is not None:
+            raise ValueError('{} is already a binary UltraVision export.'.format(fname))
+        dst.write(BINARY_MAGIC + ' {}\n'.format(dtype.str).encode())
+        while True:
+            start = src.tell()
+            header = _read_header(src)
+            if header is None:
+                break
+            # copy the header lines as they are in the text export
+            end = src.tell()
+            src.seek(start)
+            dst.write(src.read(end - start))
+
+            values, _, _ = _split_header(header)
+            nrows = int(values['ScanQty']) * int(values['IndexQty'])
+            nz = int(values['USoundQty'])
+            step = max(1, CHUNK_SIZE // nz)
+            for i in range(0, nrows, step):
+                rows = _read_rows(src, min(step, nrows - i), nz)
+                dst.write(rows.astype(dtype).tobytes())
@@ -8,6 +8,7 @@ setup(name='readers',
       packages=['readers'],
       entry_points={'console_scripts': ['readers=readers.cli:cli']},
       install_requires=['numpy', 'pandas', 'xarray'],
+      extras_require={'zarr': ['zarr'], 'hdf5': ['h5py']},
       classifiers=['Programming Language :: Python :: 3.6']
       )
 
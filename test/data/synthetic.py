@@ -0,0 +1,124 @@
+"""
+Writers for small synthetic SAFT and LeCroy binary files, and CIVA B-scan text files, used by
+the tests in place of real acquisitions, which are too large to be kept in the repository.
+"""
+from struct import pack
+import numpy as np
+
+
+# (name, width) of the SAFT header fields, in the order they are stored in the file
+SAFT_FIELDS = [
+    ('ascii', 10), ('title', 81), ('date', 9), ('time', 9), ('data_domain', 2),
+    ('data_nsets', 12), ('data_min', 7), ('data_max', 7), ('data_avg', 17),
+    ('data_projection', 4), ('data_units', 2), ('data_16bit', 7), ('data_scal_filename', 51),
+    ('probe_comment', 81), ('probe_freq_mhz', 17), ('probe_rxWedgePath_in', 17),
+    ('probe_txWedgePath_in', 17), ('probe_rxWedgeVel_in/s', 17), ('probe_txWedgeVel_in/s', 17),
+    ('probe_beamDia_in', 17), ('probe_refracted_deg', 17), ('probe_incident_deg', 17),
+    ('probe_skew_deg', 17), ('probe_mode', 2), ('probe_init_xoffset_in', 17),
+    ('probe_fnumber', 17), ('probe_xoffset_wedge', 17), ('probe_yoffset_wedge', 17),
+    ('probe_reserved', 13), ('mat_comment', 81), ('mat_velocity_in/s', 17),
+    ('mat_refracted_deg', 17), ('mat_thickness_in', 17), ('mat_pipeDia_in', 17),
+    ('mat_trackDia_in', 17), ('mat_type', 7), ('mat_reserved', 23), ('samp_comment', 81),
+    ('samp_delayinc_ns', 17), ('samp_initdelay_ns', 17), ('samp_ascan_length', 7),
+    ('samp_start_in', 17), ('samp_stop_in', 17), ('samp_averages', 7), ('samp_pulsetime', 17),
+    ('samp_step_wavepath_in', 17), ('samp_windowstart_ns', 11), ('samp_windowstop_ns', 11),
+    ('samp_depthend_window', 1), ('scan_comment', 81), ('scan_dir_deg', 17),
+    ('scan_xstart_in', 17), ('scan_ystart_in', 17), ('scan_xstop_in', 17),
+    ('scan_ystop_in', 17), ('scan_xstep_in', 17), ('scan_ystep_in', 17), ('scan_xpoints', 7),
+    ('scan_ypoints', 7), ('scan_isdownstream', 2), ('scan_tx_half_vees', 12),
+    ('scan_rx_half_vees', 12), ('scan_num_halfvees', 17), ('scan_init_pos', 17),
+    ('scan_final_pos', 17), ('scan_toward_track', 2), ('scan_scannertype', 4),
+    ('scan_pattern', 7), ('scan_zincrement', 17), ('processing', 308), ('nozzle', 68),
+    ('other', 86), ('TVG', 90), ('digi_type', 7), ('TVG_type', 7), ('pulser_type', 7),
+    ('vpp', 17), ('sync_mode', 7), ('other2', 179)]
+
+
+def write_saft(fname, data, xstep_in=0.04, ystep_in=0.08, windowstart_ns=1000.,
+               windowstop_ns=None):
+    """
+    Writes a SAFT file from an array of raw (unsigned) samples of shape (Ny, Nx, Ns). 8-bit
+    data is written for `uint8` arrays, and 16-bit data otherwise.
+    """
+    data = np.asarray(data)
+    ny, nx, ns = data.shape
+    is16 = data.dtype != np.uint8
+    if windowstop_ns is None:
+        # 100 MHz sampling
+        windowstop_ns = windowstart_ns + ns * 10.
+    values = {'ascii': 'SAFT', 'data_16bit': int(is16), 'samp_ascan_length': ns,
+              'samp_windowstart_ns': windowstart_ns, 'samp_windowstop_ns': windowstop_ns,
+              'scan_xstep_in': xstep_in, 'scan_ystep_in': ystep_in,
+              'scan_xpoints': nx, 'scan_ypoints': ny, 'scan_isdownstream': 'Y',
+              'scan_toward_track': 'Y'}
+    header = b''.join(str(values.get(name, 0))[:width].ljust(width).encode()
+                      for name, width in SAFT_FIELDS)
+
+    dtype = np.dtype('<u2' if is16 else 'u1')
+    # each A-scan is preceded by a 32 bytes data header
+    nhead = 2**5 // dtype.itemsize
+    body = np.zeros((ny, nx, nhead + ns), dtype=dtype)
+    body[:, :, nhead:] = data
+    with open(fname, 'wb') as fid:
+        fid.write(header)
+        fid.write(body.tobytes())
+
+
+def write_lecroy(fname, samples, gain=1e-3, offset=0., interval=1e-8, horiz_offset=0.):
+    """
+    Writes a LeCroy binary waveform (template LECROY_2_3, little-endian) from an array of
+    `int8` or `int16` samples.
+    """
+    samples = np.asarray(samples)
+    comm_type = int(samples.dtype.itemsize == 2)
+    samples = samples.astype('<i2' if comm_type else 'i1')
+
+    wavedesc = 11
+    desc = bytearray(346)
+
+    def put(addr, fmt, *vals):
+        desc[addr:addr + len(pack('<' + fmt, *vals))] = pack('<' + fmt, *vals)
+
+    desc[0:8] = b'WAVEDESC'
+    put(16, '16s', b'LECROY_2_3')
+    put(32, 'h', comm_type)
+    put(34, 'h', 1)
+    put(36, 'l', len(desc))
+    put(40, 'l', 0)
+    put(48, 'l', 0)
+    put(60, 'l', samples.nbytes)
+    put(76, '16s', b'SYNTHETIC')
+    put(92, 'l', 1234)
+    put(144, 'l', 1)
+    put(156, 'f', gain)
+    put(160, 'f', offset)
+    put(172, 'h', 8 * samples.dtype.itemsize)
+    put(176, 'f', interval)
+    put(180, 'd', horiz_offset)
+    put(296, 'dbbbbh', 1.5, 2, 3, 4, 5, 2017)
+    put(316, 'h', 0)
+    put(318, 'h', 0)
+    put(324, 'h', 9)
+    put(326, 'h', 0)
+    put(328, 'f', 1.)
+    put(332, 'h', 9)
+    put(334, 'h', 0)
+    put(344, 'h', 0)
+
+    with open(fname, 'wb') as fid:
+        fid.write(b'#9000000000'[:wavedesc])
+        fid.write(bytes(desc))
+        fid.write(samples.tobytes())
+
+
+def write_civa_bscan(fname, data, X, Z):
+    """
+    Writes a CIVA B-scan text file from an array of shape (len(Z), len(X)), with the scan
+    positions `X` in mm and the times `Z` in microseconds. As in the exports of CIVA, 17 header
+    lines are followed by the line of column labels, then by one line per time sample.
+    """
+    lines = ['CIVA synthetic B-scan, header line {}\n'.format(i + 1) for i in range(17)]
+    lines.append('Time (us);' + ';'.join('{:g} val'.format(x) for x in X) + '\n')
+    for z, row in zip(Z, data):
+        lines.append('{:g};'.format(z) + ';'.join('{:.6g}'.format(v) for v in row) + '\n')
+    with open(fname, 'w') as fid:
+        fid.writelines(lines)
@@ -0,0 +1,71 @@
+import readers
+from os.path import join
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import numpy.testing as npt
+from readers import cache
+from test.data.synthetic import write_lecroy
+
+
+class TestCache(unittest.TestCase):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.fname = join(self.root, 'wave.trc')
+        write_lecroy(self.fname, np.arange(100, dtype='int16'))
+        cache.invalidate()
+
+    def tearDown(self):
+        cache.invalidate()
+        cache.configure(max_entries=256, max_bytes=64 * 2**20)
+        shutil.rmtree(self.root)
+
+    def test_warm_read(self):
+        first = readers.lecroy(self.fname)
+        self.assertEqual(len(cache._cache), 1)
+        with readers.profile() as prof:
+            second = readers.lecroy(self.fname)
+        # the header is not read again
+        self.assertEqual(prof.records[0]['bytes_read'], 200)
+        npt.assert_array_equal(first['x'], second['x'])
+        # each read gets its own header
+        second['info']['channel'] = 4
+        self.assertNotEqual(readers.lecroy(self.fname)['info']['channel'], 4)
+
+        # a modified file is decoded again
+        write_lecroy(self.fname, np.arange(50, dtype='int16'))
+        self.assertEqual(len(readers.lecroy(self.fname)['x']), 50)
+        self.assertEqual(len(cache._cache), 1)
+
+    def test_ultravision(self):
+        fname = join(self.dir_path, 'data', 'ultravision_example_pa.txt')
+        first = readers.ultravision(fname, fs=100e6)
+        second = readers.ultravision(fname, fs=100e6)
+        self.assertEqual(list(first), list(second))
+        for key in first:
+            npt.assert_array_equal(first[key].values, second[key].values)
+        self.assertEqual(len(cache._cache), 1)
+        # fs given as a numpy scalar or 0-d array uses the same entry
+        readers.ultravision(fname, fs=np.array(100e6))
+        readers.ultravision(fname, fs=np.float32(100e6))
+        self.assertEqual(len(cache._cache), 1)
+        self.assertRaises(ValueError, readers.ultravision, fname, [100e6, 100e6])
+        readers.ultravision(fname)
+        self.assertEqual(len(cache._cache), 2)
+        cache.invalidate(fname)
+        self.assertEqual(len(cache._cache), 0)
+
+    def test_limits(self):
+        readers.lecroy(self.fname)
+        cache.configure(max_bytes=100)
+        self.assertEqual(len(cache._cache), 0)
+        readers.lecroy(self.fname)
+        self.assertEqual(len(cache._cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import readers
+from os.path import join
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from test.data.synthetic import write_saft, write_lecroy
+
+
+class TestCatalog(unittest.TestCase):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        shutil.copytree(join(self.dir_path, 'data'), join(self.root, 'data'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_scan(self):
+        out = readers.scan_catalog(self.root)
+        self.assertIsInstance(out, pd.DataFrame)
+        uv = out[out['format'] == 'ultravision']
+        # file has 12 angles
+        self.assertEqual(len(uv), 12)
+        self.assertTrue((uv['nx'] == 5).all())
+        self.assertTrue((uv['ny'] == 2).all())
+        self.assertTrue((uv['nz'] == 1040).all())
+        self.assertEqual(set(out['format']), {'ultravision', 'civa_cscan', 'civa_true_cscan'})
+
+    def test_binary(self):
+        write_saft(join(self.root, 'scan.saf'), np.zeros((3, 4, 50), dtype='uint8'))
+        write_lecroy(join(self.root, 'wave.trc'), np.zeros(200, dtype='int16'))
+        out = readers.scan_catalog(self.root).set_index('format')
+        self.assertEqual(tuple(out.loc['saft', ['nx', 'ny', 'nz']]), (4, 3, 50))
+        self.assertEqual(out.loc['lecroy', 'nz'], 200)
+
+    def test_cache(self):
+        cache = join(self.root, 'catalog.pkl')
+        first = readers.scan_catalog(self.root, cache=cache)
+        self.assertTrue(os.path.exists(cache))
+        second = readers.scan_catalog(self.root, workers=2, cache=cache)
+        self.assertEqual(list(first['path']), list(second['path']))
+
+        os.remove(join(self.root, 'data', 'civa_cscan.txt'))
+        third = readers.scan_catalog(self.root, cache=cache)
+        self.assertNotIn('civa_cscan', set(third['format']))
+
+
+if __name__ == "__main__":
+    unittest.main()
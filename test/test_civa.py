@@ -2,25 +2,57 @@ import readers
 from os.path import join
 import unittest
 import numpy as np
-import pandas.util.testing as pdt
 import numpy.testing as npt
 import os
+import shutil
+import tempfile
 import xarray as xr
-from matplotlib import pyplot
+from test.data.synthetic import write_civa_bscan
 
 
 class TestCIVA(unittest.TestCase):
     dir_path = os.path.dirname(os.path.realpath(__file__))
 
+    def _write_bscan(self, root):
+        fname = join(root, 'bscan.txt')
+        data = np.random.rand(50, 8)
+        X, Z = 0.5 + np.arange(8)*0.25, 2 + np.arange(50)*0.02
+        write_civa_bscan(fname, data, X, Z)
+        return fname, data, X, Z
+
     def test_bscan(self):
-        fname = join(self.dir_path, 'data', 'civa_bscan.txt')
-        out = readers.civa.bscan(fname)
-        self.assertIsInstance(out, xr.DataArray)
-        self.assertTrue(out.Z.attrs['units'] == 's')
-        self.assertTrue(out.X.attrs['units'] == 'mm')
-        pyplot.pcolormesh(out.X, out.Z, out)
-        pyplot.title('CIVA B-Scan')
-        pyplot.show()
+        root = tempfile.mkdtemp()
+        try:
+            fname, data, X, Z = self._write_bscan(root)
+            out = readers.civa.bscan(fname)
+            self.assertIsInstance(out, xr.DataArray)
+            self.assertTrue(out.Z.attrs['units'] == 's')
+            self.assertTrue(out.X.attrs['units'] == 'mm')
+            self.assertEqual(out.dims, ('Z', 'X'))
+            npt.assert_allclose(out.X, X)
+            npt.assert_allclose(out.Z, Z*1e-6)
+            npt.assert_allclose(out.values, data, rtol=1e-5)
+        finally:
+            shutil.rmtree(root)
+
+    def test_bscan_roi(self):
+        root = tempfile.mkdtemp()
+        try:
+            fname, data, X, Z = self._write_bscan(root)
+            full = readers.civa.bscan(fname)
+            x, z = slice(full.X.values[2], full.X.values[5]), slice(full.Z.values[10], None)
+            out = readers.civa.bscan(fname, x=x, z=z)
+            self.assertEqual(out.shape, (40, 4))
+            npt.assert_array_equal(out.values, full.sel(X=x, Z=z).values)
+            npt.assert_array_equal(out.X, full.X[2:6])
+
+            # a window closed on both sides, and a single column
+            z = slice(full.Z.values[5], full.Z.values[9])
+            out = readers.civa.bscan(fname, x=slice(X[3], X[3]), z=z)
+            self.assertEqual(out.shape, (5, 1))
+            npt.assert_array_equal(out.values, full.values[5:10, 3:4])
+        finally:
+            shutil.rmtree(root)
 
     def test_truecscan(self):
         fname = join(self.dir_path, 'data', 'civa_truecscan.grid')
@@ -28,17 +60,46 @@ class TestCIVA(unittest.TestCase):
         self.assertIsInstance(out, xr.DataArray)
         self.assertTrue(out.X.attrs['units'] == 'mm')
         self.assertTrue(out.Y.attrs['units'] == 'mm')
-        pyplot.pcolormesh(out.X, out.Y, out)
-        pyplot.title('CIVA True C-SCAN')
-        pyplot.show()
 
     def test_cscan(self):
         fname = join(self.dir_path, 'data', 'civa_cscan.txt')
         out = readers.civa.cscan(fname)
         self.assertIsInstance(out, xr.DataArray)
-        pyplot.pcolormesh(out.X, out.Y, out)
-        pyplot.title('CIVA C-SCAN')
-        pyplot.show()
+
+    def test_sweep(self):
+        fname = join(self.dir_path, 'data', 'civa_truecscan.grid')
+        root = tempfile.mkdtemp()
+        try:
+            for angle in [30, 45, 60]:
+                shutil.copy(fname, join(root, 'angle_{}.grid'.format(angle)))
+            ref = readers.civa.true_cscan(fname)
+            for workers in [None, 2]:
+                ds = readers.civa.sweep(join(root, 'angle_{}.grid'), [30, 45, 60],
+                                        dim='angle', workers=workers)
+                self.assertIsInstance(ds, xr.Dataset)
+                self.assertEqual(ds['amplitude'].dims, ('angle', 'Y', 'X'))
+                npt.assert_array_equal(ds['angle'], [30, 45, 60])
+                npt.assert_array_equal(ds['amplitude'][2], ref)
+                self.assertEqual(ds.X.attrs['units'], 'mm')
+
+            # a file with another grid
+            with open(fname) as fid:
+                lines = fid.readlines()
+            lines[2] = 'ratioX;0.6\n'
+            with open(join(root, 'angle_60.grid'), 'w') as fid:
+                fid.writelines(lines)
+            self.assertRaises(ValueError, readers.civa.sweep, join(root, 'angle_*.grid'),
+                              [30, 45, 60])
+
+            # plain C-scans have no grid header, their axes are compared after parsing
+            fname = join(self.dir_path, 'data', 'civa_cscan.txt')
+            for angle in [30, 45]:
+                shutil.copy(fname, join(root, 'cscan_{}.txt'.format(angle)))
+            ds = readers.civa.sweep([join(root, 'cscan_30.txt'), join(root, 'cscan_45.txt')],
+                                    [30, 45], kind='cscan', workers=2)
+            npt.assert_array_equal(ds['amplitude'][1], readers.civa.cscan(fname))
+        finally:
+            shutil.rmtree(root)
 
 
 if __name__ == "__main__":
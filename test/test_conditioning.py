@@ -0,0 +1,86 @@
+import readers
+from os.path import join
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import numpy.testing as npt
+from readers import conditioning
+from test.data.synthetic import write_lecroy
+
+
+class TestConditioning(unittest.TestCase):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.chunk_size = conditioning.CHUNK_SIZE
+
+    def tearDown(self):
+        conditioning.CHUNK_SIZE = self.chunk_size
+        shutil.rmtree(self.root)
+
+    def test_band(self):
+        dt = 1e-8
+        t = np.arange(1000)*dt
+        inside, outside = np.sin(2*np.pi*5e6*t), np.sin(2*np.pi*30e6*t)
+        cond = readers.Conditioning(band=(2e6, 10e6), dtype='float64')
+        y = cond.apply(inside + outside, dt)
+        self.assertEqual(y.dtype, np.float64)
+        npt.assert_allclose(y[100:-100], inside[100:-100], atol=0.05)
+
+    def test_envelope(self):
+        dt = 1e-8
+        t = np.arange(1000)*dt
+        amplitude = 1 + 0.5*np.cos(2*np.pi*0.2e6*t)
+        cond = readers.Conditioning(envelope=True)
+        y = cond.apply(amplitude*np.sin(2*np.pi*10e6*t), dt)
+        self.assertEqual(y.dtype, np.float32)
+        npt.assert_allclose(y[100:-100], amplitude[100:-100], atol=0.05)
+
+    def test_chunks(self):
+        data = np.random.randn(6, 5, 64)
+        cond = readers.Conditioning(band=(1e6, 20e6), envelope=True, dtype='float64')
+        full = cond.apply(data, 1e-8)
+        conditioning.CHUNK_SIZE = 100
+        npt.assert_allclose(cond.apply(data, 1e-8), full)
+
+    def test_long_record(self):
+        # records longer than CHUNK_SIZE are filtered in blocks by overlap-save
+        dt = 1e-8
+        t = np.arange(100000)*dt
+        inside = np.sin(2*np.pi*5e6*t)
+        x = inside + np.sin(2*np.pi*30e6*t)
+        for envelope in [False, True]:
+            cond = readers.Conditioning(band=(2e6, 10e6), envelope=envelope, dtype='float64')
+            full = cond.apply(x, dt)
+            conditioning.CHUNK_SIZE = 10000
+            y = cond.apply(x, dt)
+            conditioning.CHUNK_SIZE = self.chunk_size
+            npt.assert_allclose(y[5000:-5000], full[5000:-5000], atol=1e-4)
+            expected = np.ones(len(t)) if envelope else inside
+            npt.assert_allclose(y[5000:-5000], expected[5000:-5000], atol=0.02)
+
+    def test_lecroy(self):
+        fname = join(self.root, 'wave.trc')
+        write_lecroy(fname, np.random.randint(-1000, 1000, 500).astype('int16'))
+        cond = readers.Conditioning(band=(1e6, 20e6), envelope=True)
+        wave = readers.lecroy(fname)
+        npt.assert_allclose(readers.lecroy(fname, condition=cond)['y'],
+                            cond.apply(wave['y'], wave['info']['Ts']), rtol=1e-6)
+
+    def test_ultravision(self):
+        text = join(self.dir_path, 'data', 'ultravision_example_pa.txt')
+        binary = join(self.root, 'scan.uvb')
+        readers.write_ultravision_binary(text, binary, dtype='<f8')
+        cond = readers.Conditioning(band=(1e6, 10e6), dtype='float64')
+        full = readers.ultravision(text, fs=100e6)
+        for fname in [text, binary]:
+            out = readers.ultravision(fname, fs=100e6, condition=cond)
+            for key, da in full.items():
+                npt.assert_allclose(out[key].values, cond.apply(da.values, 1e-8), atol=1e-9)
+
+
+if __name__ == "__main__":
+    unittest.main()
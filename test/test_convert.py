@@ -0,0 +1,93 @@
+import readers.convert
+from os.path import join
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import numpy.testing as npt
+from test.data.synthetic import write_saft
+
+try:
+    import zarr
+except ImportError:
+    zarr = None
+
+
+@unittest.skipIf(zarr is None, 'zarr is not installed')
+class TestConvert(unittest.TestCase):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    fname = join(dir_path, 'data', 'ultravision_example_pa.txt')
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def test_ultravision(self):
+        out = join(self.outdir, 'uv.zarr')
+        self.assertTrue(readers.convert.convert(self.fname, out, chunks={'X': 2, 'Y': 1}))
+        root = zarr.open_group(out, mode='r')
+        # file has 12 angles
+        self.assertEqual(len(list(root.group_keys())), 12)
+        block = root['Half Path 87']
+        self.assertEqual(block['data'].shape, (5, 2, 1040))
+        self.assertEqual(block['data'].chunks[:2], (2, 1))
+        self.assertEqual(block['X'].attrs['units'], 'mm')
+
+        # already converted, nothing to do
+        self.assertFalse(readers.convert.convert(self.fname, out, chunks={'X': 2, 'Y': 1}))
+
+        # converted again with other chunks
+        self.assertTrue(readers.convert.convert(self.fname, out, chunks={'Z': 100}))
+        root = zarr.open_group(out, mode='r')
+        self.assertEqual(root['Half Path 87']['data'].chunks, (5, 2, 100))
+        self.assertEqual(root.attrs['chunks'], [64, 16, 100])
+        self.assertFalse(readers.convert.convert(self.fname, out, chunks={'Z': 100}))
+
+    def test_saft(self):
+        raw = np.random.randint(0, 256, (3, 4, 20)).astype('uint8')
+        fname = join(self.outdir, 'scan.saf')
+        write_saft(fname, raw)
+        res = readers.convert.convert_files([fname], self.outdir)
+        self.assertTrue(res[fname])
+        data = zarr.open_group(join(self.outdir, 'scan.zarr'), mode='r')['data'][:]
+        npt.assert_array_equal(data, np.transpose(raw.astype(int) - 128, (1, 0, 2)))
+
+    def test_resume(self):
+        raw = np.random.randint(0, 256, (3, 4, 20)).astype('uint8')
+        fname = join(self.outdir, 'scan.saf')
+        write_saft(fname, raw)
+        out = join(self.outdir, 'scan.zarr')
+
+        recenter = readers.convert._recenter
+        calls = []
+
+        def interrupted(slab):
+            calls.append(slab.shape)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return recenter(slab)
+
+        readers.convert._recenter = interrupted
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                readers.convert.convert(fname, out, chunks={'Y': 1})
+            self.assertEqual(zarr.open_group(out, mode='r')['data'].attrs['written'], 1)
+
+            # only the two slabs left are read and written again
+            del calls[:]
+            readers.convert._recenter = lambda slab: calls.append(slab.shape) or recenter(slab)
+            self.assertTrue(readers.convert.convert(fname, out, chunks={'Y': 1}))
+            self.assertEqual(len(calls), 2)
+        finally:
+            readers.convert._recenter = recenter
+
+        data = zarr.open_group(out, mode='r')['data']
+        self.assertEqual(data.attrs['written'], 3)
+        npt.assert_array_equal(data[:], np.transpose(raw.astype(int) - 128, (1, 0, 2)))
+
+
+if __name__ == "__main__":
+    unittest.main()
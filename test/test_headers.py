@@ -0,0 +1,45 @@
+from os.path import join
+import unittest
+import pickle
+import shutil
+import tempfile
+import numpy as np
+from readers.headers import SaftHeader, collect
+from readers.saft import _read_file_header
+from test.data.synthetic import write_saft
+
+
+class TestHeaders(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path)
+
+    def test_saft(self):
+        headers = []
+        for i in range(3):
+            fname = join(self.dir_path, 'scan{}.saf'.format(i))
+            write_saft(fname, np.zeros((2, i + 1, 10), dtype='uint8'))
+            headers.append(_read_file_header(fname))
+        h = headers[0]
+        self.assertIsInstance(h, SaftHeader)
+        self.assertFalse(hasattr(h, '__dict__'))
+        self.assertEqual(h['mat_velocity_in/s'], 0.)
+        self.assertNotIn('data_offset', h)
+        self.assertRaises(KeyError, lambda: h['data_offset'])
+
+        # fields which are not part of the format are still accepted
+        h['comment'] = 'calibration'
+        self.assertEqual(h['comment'], 'calibration')
+        self.assertEqual(pickle.loads(pickle.dumps(h)), h)
+
+        frame = collect(headers)
+        self.assertEqual(len(frame), 3)
+        self.assertEqual(list(frame['scan_xpoints']), [1, 2, 3])
+        self.assertEqual(frame['comment'][0], 'calibration')
+        self.assertTrue(frame['comment'][1:].isnull().all())
+
+
+if __name__ == "__main__":
+    unittest.main()
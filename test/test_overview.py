@@ -0,0 +1,91 @@
+import readers
+from os.path import join
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+import numpy.testing as npt
+from test.data.synthetic import write_lecroy, write_saft
+
+# readers.overview is the function
+overview = sys.modules['readers.overview']
+
+
+class TestOverview(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.chunk_size = overview.CHUNK_SIZE
+        self.reduce = overview._reduce
+
+    def tearDown(self):
+        overview.CHUNK_SIZE = self.chunk_size
+        overview._reduce = self.reduce
+        shutil.rmtree(self.root)
+
+    def test_lecroy(self):
+        fname = join(self.root, 'wave.trc')
+        samples = np.random.randint(-2**15, 2**15, 10000).astype('int16')
+        write_lecroy(fname, samples)
+        wave = readers.lecroy(fname)
+        # chunks which do not hold a whole number of the coarser bins
+        overview.CHUNK_SIZE = 1000
+        ovr = readers.overview(fname, factor=4, min_size=100)
+        self.assertEqual([lo.shape[-1] for lo, _ in ovr.levels], [2500, 625, 157, 40])
+
+        view = ovr.fetch(npoints=150)
+        npt.assert_allclose(view.Z, wave['x'][::64])
+        y = np.pad(wave['y'], (0, 157*64 - 10000), mode='edge').reshape(-1, 64)
+        npt.assert_allclose(view['min'], y.min(axis=1))
+        npt.assert_allclose(view['max'], y.max(axis=1))
+
+        # short ranges are read at full resolution
+        view = ovr.fetch(z=slice(wave['x'][100], wave['x'][199]), npoints=50)
+        npt.assert_allclose(view['min'], wave['y'][100:200])
+        npt.assert_allclose(view['max'], wave['y'][100:200])
+
+    def test_saft(self):
+        fname = join(self.root, 'scan.saf')
+        raw = np.random.randint(0, 256, (3, 4, 100)).astype('uint8')
+        write_saft(fname, raw)
+        ovr = readers.overview(fname, factor=10, min_size=1)
+        self.assertEqual(len(ovr.levels), 2)
+        view = ovr.fetch(x=slice(ovr.X[1], ovr.X[2]), npoints=10)
+        self.assertEqual(view['min'].dims, ('X', 'Y', 'Z'))
+        self.assertEqual(ovr.levels[0][0].shape, (4, 3, 10))
+        blocks = raw[:, 1:3].transpose(1, 0, 2).astype(float).reshape(2, 3, 10, 10) - 128
+        npt.assert_array_equal(view['min'], blocks.min(axis=-1))
+        npt.assert_array_equal(view['max'], blocks.max(axis=-1))
+
+    def test_persist(self):
+        fname = join(self.root, 'wave.trc')
+        path = join(self.root, 'wave.npz')
+        write_lecroy(fname, np.arange(5000, dtype='int16'))
+        first = readers.overview(fname, path=path)
+        self.assertTrue(os.path.exists(path))
+        # loaded from the file, without reading the samples
+        overview._reduce = None
+        second = readers.overview(fname, path=path)
+        for (a, b), (c, d) in zip(first.levels, second.levels):
+            npt.assert_array_equal(a, c)
+            npt.assert_array_equal(b, d)
+        self.assertAlmostEqual(float(second.fetch(npoints=10)['max'].max()), 4.999, places=5)
+
+        # rebuilt with more levels when min_size is smaller
+        overview._reduce = self.reduce
+        deeper = readers.overview(fname, path=path, min_size=10)
+        self.assertGreater(len(deeper.levels), len(first.levels))
+        overview._reduce = None
+        self.assertEqual(len(readers.overview(fname, path=path, min_size=10).levels),
+                         len(deeper.levels))
+
+        # rebuilt when the file changes
+        overview._reduce = self.reduce
+        write_lecroy(fname, np.arange(2000, dtype='int16'))
+        self.assertAlmostEqual(float(readers.overview(fname, path=path).fetch()['max'].max()),
+                               1.999, places=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
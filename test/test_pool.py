@@ -0,0 +1,65 @@
+import readers
+from os.path import join
+import unittest
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import numpy.testing as npt
+from readers import pool
+from test.data.synthetic import write_lecroy
+
+
+class TestPool(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        pool.clear()
+
+    def tearDown(self):
+        pool.clear()
+        shutil.rmtree(self.dir_path)
+
+    def test_reuse(self):
+        fname = join(self.dir_path, 'wave.trc')
+        write_lecroy(fname, np.arange(100, dtype='int16'))
+        first = readers.lecroy(fname)
+        mm = pool._get_map(fname)
+        readers.lecroy(fname)
+        self.assertIs(pool._get_map(fname), mm)
+        self.assertEqual(len(pool._pool), 1)
+
+        # a modified file is mapped again
+        write_lecroy(fname, np.arange(200, dtype='int16'))
+        self.assertEqual(len(readers.lecroy(fname)['y']), 200)
+        self.assertEqual(len(pool._pool), 1)
+        npt.assert_allclose(first['y'], np.arange(100) * np.float32(1e-3))
+
+    def test_ultravision_binary(self):
+        text = join(os.path.dirname(os.path.realpath(__file__)), 'data',
+                    'ultravision_example_pa.txt')
+        fname = join(self.dir_path, 'scan.uvb')
+        readers.write_ultravision_binary(text, fname)
+        first = readers.ultravision(fname)
+        mm = pool._get_map(fname)
+        second = readers.ultravision(fname)
+        # all the blocks of both reads are views of the same pooled map
+        self.assertIs(pool._get_map(fname), mm)
+        self.assertEqual(len(pool._pool), 1)
+        for key, da in first.items():
+            self.assertFalse(da.values.flags.writeable)
+            npt.assert_array_equal(da.values, second[key].values)
+
+    def test_eviction(self):
+        fnames = [join(self.dir_path, 'wave{}.trc'.format(i)) for i in range(pool.POOL_SIZE + 4)]
+        for i, fname in enumerate(fnames):
+            write_lecroy(fname, np.full(10, i, dtype='int8'))
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            out = list(executor.map(readers.lecroy, fnames * 3))
+        self.assertEqual(len(pool._pool), pool.POOL_SIZE)
+        for i, wave in enumerate(out):
+            npt.assert_allclose(wave['y'], np.float32(1e-3) * (i % len(fnames)))
+
+
+if __name__ == "__main__":
+    unittest.main()
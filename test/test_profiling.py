@@ -0,0 +1,51 @@
+import readers
+from os.path import join
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from readers import profiling
+from test.data.synthetic import write_lecroy
+
+
+class TestProfiling(unittest.TestCase):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.fname = join(self.root, 'wave.trc')
+        write_lecroy(self.fname, np.arange(100, dtype='int16'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_records(self):
+        records = []
+        with readers.profile(callback=records.append) as prof:
+            readers.lecroy(self.fname)
+            readers.ultravision(join(self.dir_path, 'data', 'ultravision_example_pa.txt'))
+        self.assertEqual(records, prof.records)
+        self.assertEqual([r['reader'] for r in prof.records], ['lecroy', 'ultravision'])
+
+        lecroy = prof.records[0]
+        self.assertEqual(lecroy['bytes_read'], os.path.getsize(self.fname))
+        self.assertEqual(lecroy['peak_array_bytes'], 100 * 8)
+        self.assertEqual(set(lecroy['phases']), {'header', 'coords', 'parse', 'reshape'})
+        self.assertGreaterEqual(lecroy['total'], sum(lecroy['phases'].values()))
+
+        frame = prof.to_frame()
+        self.assertEqual(len(frame), 2)
+        self.assertIn('phase_parse', frame.columns)
+
+    def test_disabled(self):
+        readers.lecroy(self.fname)
+        self.assertIs(profiling._phase('parse'), profiling._NULL_PHASE)
+        with readers.profile() as prof:
+            pass
+        readers.lecroy(self.fname)
+        self.assertEqual(prof.records, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import readers
+from os.path import join
+import unittest
+import shutil
+import tempfile
+import numpy as np
+import numpy.testing as npt
+import xarray as xr
+from test.data.synthetic import write_saft, write_lecroy
+
+
+class TestRaster(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path)
+
+    def test_lecroy(self):
+        x, y = np.meshgrid([0., 1., 2.], [10., 20.], indexing='ij')
+        x, y = x.ravel(), y.ravel()
+        samples = np.random.randint(-100, 100, (len(x), 50)).astype('int8')
+        fnames = []
+        for i, s in enumerate(samples):
+            fnames.append(join(self.dir_path, 'wave{}.trc'.format(i)))
+            write_lecroy(fnames[-1], s, gain=1e-3)
+
+        out = readers.raster(fnames, x, y, units='mm', workers=2)
+        self.assertIsInstance(out, xr.DataArray)
+        self.assertEqual(out.dims, ('X', 'Y', 'Z'))
+        self.assertEqual(out.shape, (3, 2, 50))
+        self.assertEqual(out.coords['X'].attrs['units'], 'mm')
+        npt.assert_allclose(out.values.reshape(6, 50), samples * np.float32(1e-3))
+
+    def test_saft(self):
+        raw = np.random.randint(0, 256, (4, 6, 30)).astype('uint8')
+        fnames = [join(self.dir_path, 'part{}.saf'.format(i)) for i in range(2)]
+        # split the raster along the index direction
+        write_saft(fnames[0], raw[:2], ystep_in=0.1)
+        write_saft(fnames[1], raw[2:], ystep_in=0.1)
+
+        memmap = join(self.dir_path, 'volume.dat')
+        out = readers.raster(fnames, x=[0, 0], y=[0, 2 * 0.1 * 25.4e-3], out=memmap)
+        self.assertEqual(out.shape, (6, 4, 30))
+        npt.assert_array_equal(out.values, np.transpose(raw - 128., (1, 0, 2)))
+
+    def test_mismatch(self):
+        fnames = [join(self.dir_path, 'wave{}.trc'.format(i)) for i in range(3)]
+        samples = np.zeros(50, dtype='int8')
+        write_lecroy(fnames[0], samples)
+        write_lecroy(fnames[1], samples, interval=2e-8)
+        write_lecroy(fnames[2], samples, horiz_offset=1e-6)
+        for other in fnames[1:]:
+            self.assertRaises(ValueError, readers.raster, [fnames[0], other], [0, 1], [0, 0])
+
+        saft = [join(self.dir_path, 'part{}.saf'.format(i)) for i in range(2)]
+        raw = np.zeros((2, 3, 30), dtype='uint8')
+        write_saft(saft[0], raw, ystep_in=0.1)
+        write_saft(saft[1], raw, ystep_in=0.2)
+        self.assertRaises(ValueError, readers.raster, saft)
+        write_saft(saft[1], raw, ystep_in=0.1, windowstart_ns=2000.)
+        self.assertRaises(ValueError, readers.raster, saft)
+
+        # files of different formats
+        self.assertRaises(ValueError, readers.raster, [saft[0], fnames[0]], [0, 1], [0, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
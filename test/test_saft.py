@@ -0,0 +1,76 @@
+import readers
+from os.path import join
+import unittest
+import shutil
+import tempfile
+import numpy as np
+import numpy.testing as npt
+import xarray as xr
+from test.data.synthetic import write_saft
+
+
+class TestSAFT(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path)
+
+    def _write(self, dtype):
+        info = np.iinfo(dtype)
+        raw = np.random.randint(info.min, info.max + 1, (3, 4, 20)).astype(dtype)
+        fname = join(self.dir_path, 'scan.saf')
+        write_saft(fname, raw)
+        return fname, raw
+
+    def test_float(self):
+        fname, raw = self._write('uint8')
+        data, header = readers.saft(fname)
+        self.assertIsInstance(data, xr.DataArray)
+        self.assertEqual(data.dims, ('X', 'Y', 'Z'))
+        self.assertEqual(data.Z.attrs['units'], 's')
+        self.assertEqual(data.values.dtype, np.float64)
+        npt.assert_array_equal(data.values, np.transpose(raw - 128., (1, 0, 2)))
+
+    def test_native(self):
+        for dtype, signed in [('uint8', np.int8), ('uint16', np.int16)]:
+            fname, raw = self._write(dtype)
+            data, header = readers.saft(fname, native=True)
+            self.assertEqual(data.values.dtype, signed)
+            self.assertEqual(data.attrs['data_offset'], header['data_offset'])
+            expected = raw.astype(int) - header['data_offset']
+            npt.assert_array_equal(data.values*data.attrs['scale'],
+                                   np.transpose(expected, (1, 0, 2)))
+
+    def test_roi(self):
+        fname, raw = self._write('uint8')
+        full, _ = readers.saft(fname)
+        X, Y, t = full.X.values, full.Y.values, full.Z.values
+        data, _ = readers.saft(fname, x=slice(X[1], X[2]), y=slice(Y[1], None),
+                               z=slice(t[5], t[14]))
+        self.assertEqual(data.values.shape, (2, 2, 10))
+        npt.assert_array_equal(data.values, full.values[1:3, 1:, 5:15])
+
+    def test_progress(self):
+        fname, raw = self._write('uint16')
+        calls = []
+        readers.saft(fname, progress=lambda done, total: calls.append((done, total)))
+        self.assertEqual(calls[-1], (raw.nbytes, raw.nbytes))
+
+        token = readers.CancelToken()
+        token.cancel()
+        self.assertRaises(readers.ReadCancelled, lambda: readers.saft(fname, cancel=token))
+
+    def test_condition(self):
+        fname, raw = self._write('uint16')
+        full, header = readers.saft(fname)
+        cond = readers.Conditioning(band=(1e6, 20e6), envelope=True)
+        data, _ = readers.saft(fname, condition=cond)
+        self.assertEqual(data.values.dtype, np.float32)
+        expected = cond.apply(full.values, 1/header['sampling_rate'])
+        npt.assert_allclose(data.values, expected, rtol=1e-5)
+        self.assertRaises(ValueError, lambda: readers.saft(fname, native=True, condition=cond))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,12 @@
 import readers
+from readers import _ultravision
 from os.path import join
 import unittest
 import numpy as np
-import pandas.util.testing as pdt
 import numpy.testing as npt
 import os
+import shutil
+import tempfile
 import xarray as xr
 
 
@@ -19,8 +21,66 @@ class TestUV(unittest.TestCase):
         out = readers.ultravision(self.fname)
         self.assertIsInstance(out, dict)
 
+    def test_roi(self):
+        full = readers.ultravision(self.fname, fs=100e6)
+        key = sorted(full)[0]
+        X, Y = full[key].coords['X'].values, full[key].coords['Y'].values
+        out = readers.ultravision(self.fname, fs=100e6, x=slice(X[1], X[3]), y=slice(Y[1], None),
+                                  z=slice(1e-6, 2e-6))
+        self.assertEqual(len(out), self.ntheta)
+        self.assertEqual(out[key].shape, (3, 1, 101))
+        for k in full:
+            npt.assert_array_equal(out[k].values, full[k].sel(X=out[k].X, Y=out[k].Y,
+                                                              Z=out[k].Z).values)
+
+    def test_progress(self):
+        calls = []
+        readers.ultravision(self.fname, progress=lambda done, total: calls.append((done, total)))
+        self.assertEqual(len(calls), self.ntheta)
+        self.assertEqual(calls[-1], (os.path.getsize(self.fname),) * 2)
+
+        # cancel the read after the first block
+        token = readers.CancelToken()
+        self.assertRaises(readers.ReadCancelled,
+                          lambda: readers.ultravision(self.fname, cancel=token,
+                                                      progress=lambda done, total: token.cancel()))
+
+    def test_binary(self):
+        dir_path = tempfile.mkdtemp()
+        try:
+            fname = join(dir_path, 'scan.uvb')
+            readers.write_ultravision_binary(self.fname, fname)
+            text = readers.ultravision(self.fname, fs=100e6)
+            out = readers.ultravision(fname, fs=100e6)
+            self.assertEqual(list(out), list(text))
+            for key in text:
+                self.assertEqual(out[key].dims, ('X', 'Y', 'Z'))
+                npt.assert_allclose(out[key].values, text[key].values, rtol=1e-6)
+                npt.assert_array_equal(out[key].coords['X'], text[key].coords['X'])
+
+            # region of interest, and phased array cube
+            key = sorted(text)[0]
+            roi = readers.ultravision(fname, fs=100e6, y=slice(None, text[key].Y.values[0]),
+                                      z=slice(1e-6, 2e-6))
+            self.assertEqual(roi[key].shape, (5, 1, 101))
+            cube = _ultravision.ultravision(fname, [45] * self.ntheta, 100e6, 3260)
+            npt.assert_allclose(cube.values[..., 0], text[key].values, rtol=1e-6)
+            del out, roi
+
+            # the binary export is not converted again
+            self.assertRaises(ValueError, readers.write_ultravision_binary, fname,
+                              join(dir_path, 'again.uvb'))
+
+            # no type of the samples after the magic
+            bad = join(dir_path, 'bad.uvb')
+            with open(bad, 'wb') as fid:
+                fid.write(b'UVBINARY\n')
+            self.assertRaises(IOError, readers.ultravision, bad)
+        finally:
+            shutil.rmtree(dir_path)
+
     def test_with_parameters(self):
-        out = readers.ultravision(self.fname, [45] * self.ntheta, 100e6, 3260)
+        out = _ultravision.ultravision(self.fname, [45] * self.ntheta, 100e6, 3260)
         self.assertIsInstance(out, xr.DataArray)
         self.assertTrue(out.coords['X'].attrs['units'] == 'mm')
         self.assertTrue(out.coords['Y'].attrs['units'] == 'mm')
@@ -28,9 +88,45 @@ class TestUV(unittest.TestCase):
 
     def test_wrong_parameters(self):
         """ Did not supply the correct number of angles to the file."""
-        self.assertRaises(ValueError, lambda: readers.ultravision(self.fname,
-                                                                  [45] * (self.ntheta - 2),
-                                                                  100e6, 3260))
+        with self.assertRaisesRegex(ValueError, 'Number of angles'):
+            _ultravision.ultravision(self.fname, [45] * (self.ntheta - 2), 100e6, 3260)
+
+    def test_phased_array_cube(self):
+        """ The 4-D cube holds the same data as the per focal law arrays."""
+        cube = _ultravision.ultravision(self.fname, [45] * self.ntheta, 100e6, 3260)
+        self.assertEqual(cube.dims, ('X', 'Y', 'Z', 'angle'))
+        laws = _ultravision.ultravision(self.fname)
+        self.assertEqual(len(laws), self.ntheta)
+        for i, key in enumerate(sorted(laws)):
+            npt.assert_array_equal(cube.values[..., i], laws[key].values)
+
+    def test_focal_law_axes(self):
+        """ Each focal law gets its own time axis, and can be resampled on a common one."""
+        angles = np.linspace(40, 62, self.ntheta)
+        out = _ultravision.ultravision(self.fname, angles, 100e6, 3260)
+        self.assertEqual(out.coords['Z_law'].dims, ('angle', 'Z'))
+        npt.assert_allclose(np.diff(out.coords['Z_law'].values, axis=1), 1e-8)
+
+        z = np.arange(500) / 100e6
+        out = _ultravision.ultravision(self.fname, angles, 100e6, 3260, resample=z)
+        self.assertEqual(out.shape, (5, 2, 500, self.ntheta))
+        npt.assert_array_equal(out.coords['Z'].values, z)
+
+    def test_sscan(self):
+        angles = np.linspace(40, 62, self.ntheta)
+        data = _ultravision.ultravision(self.fname, angles, 100e6, 3260)
+        lateral = np.linspace(0, 0.05, 40)
+        depth = np.linspace(0.001, 0.04, 30)
+        out = readers.sscan(data, 3260, lateral=lateral, depth=depth)
+        self.assertEqual(out.dims, ('X', 'Y', 'depth', 'lateral'))
+        self.assertEqual(out.shape, (5, 2, 30, 40))
+
+        # pixel on the sound path of a focal law: same value as the A-scan sample
+        k, j = 3, 200
+        r = 3260 * data.coords['Z_law'].values[k, j] / 2
+        theta = np.deg2rad(angles[k])
+        out = readers.sscan(data, 3260, lateral=[r * np.sin(theta)], depth=[r * np.cos(theta)])
+        npt.assert_allclose(out.values[:, :, 0, 0], data.values[:, :, j, k])
 
 
 if __name__ == "__main__":